@@ -0,0 +1,52 @@
+"""比较顺序与并发获取全国天气预报的耗时
+
+用法：python -m benchmarks.bench_concurrent [--latency 秒] [--workers N]
+[--processes N]
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+import os
+from weather_com_cn.forecast import WeatherCrawler
+from .fixtures import generatePages
+from .server import StandInServer
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with StandInServer(generatePages(), latency=args.latency) as server:
+        crawler = WeatherCrawler(page_ttl=0)
+        crawler.base_url = server.base_url
+        crawler.url = server.base_url + '/textFC/hb.shtml'
+        urls = [url for url in crawler.getAreasList().values()] * 2
+        executor = ProcessPoolExecutor(args.processes)
+        modes = (('sequential', 1, None),
+                 (f'threads={args.workers}', args.workers, None),
+                 (f'threads={args.workers}+processes={args.processes}',
+                  args.workers, executor))
+        expected = None
+        with executor:
+            for name, workers, parse_executor in modes:
+                best = float('inf')
+                for _ in range(args.repeat):
+                    start = perf_counter()
+                    weathers = crawler.getWeathers(
+                        urls,
+                        max_workers=workers,
+                        parse_executor=parse_executor)
+                    best = min(best, perf_counter() - start)
+                if expected is None:
+                    expected = weathers
+                assert weathers == expected, f'{name} 的结果与顺序获取的不一致'
+                print(f'{name:<28} pages={len(urls)} rows={len(weathers)} '
+                      f'best={best:.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""统计各种用法下导入 weather_com_cn 的耗时及导入的依赖
+
+用法：python -m benchmarks.bench_import [--repeat N] [--importtime 语句]
+
+每条导入语句在 N 个新的解释器中分别执行，报告导入耗时的中位数、
+导入的模块数及其中的重量级依赖。运行前先编译全部源码，以免计入编译 .pyc 的耗时。
+--importtime 以 python -X importtime 执行该语句，列出自身耗时最长的模块。
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+from statistics import median
+from typing import List, Tuple
+import compileall
+import json
+import subprocess
+import sys
+import weather_com_cn
+
+STATEMENTS = (
+    'import weather_com_cn',
+    'from weather_com_cn.alarm import AlarmCrawler',
+    'from weather_com_cn.common import LocationID',
+    'from weather_com_cn.forecast import WeatherCrawler',
+)
+HEAVY = ('requests', 'bs4', 'lxml', 'pydantic', 'aenum', 'bidict', 'numpy',
+         'aiohttp')
+_PROBE = '''
+import time
+start = time.perf_counter()
+exec({statement!r})
+elapsed = time.perf_counter() - start
+import json, sys
+print(json.dumps({{'ms': elapsed * 1000, 'modules': len(sys.modules),
+                  'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def probe(statement: str) -> dict:
+    "在新的解释器中执行 statement"
+    return json.loads(
+        subprocess.check_output([
+            sys.executable, '-c',
+            _PROBE.format(statement=statement, heavy=HEAVY)
+        ]))
+
+
+def importTime(statement: str, top: int = 15) -> List[Tuple[int, int, str]]:
+    "以 -X importtime 执行 statement，返回自身耗时最长的模块（自身、累计微秒，模块名）"
+    stderr: str = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True).stderr
+    rows: List[Tuple[int, int, str]] = []
+    for line in stderr.splitlines()[1:]:
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--importtime', metavar='STATEMENT')
+    args = parser.parse_args()
+
+    compileall.compile_dir(str(Path(weather_com_cn.__file__).parent), quiet=1)
+    if args.importtime:
+        for self_us, cumulative_us, name in importTime(args.importtime):
+            print(f'{self_us / 1000:8.2f}ms {cumulative_us / 1000:8.2f}ms '
+                  f'{name}')
+        return
+    for statement in STATEMENTS:
+        results = [probe(statement) for _ in range(args.repeat)]
+        print(f'{statement:<52} '
+              f'{median(r["ms"] for r in results):7.1f}ms '
+              f'modules={results[0]["modules"]} '
+              f'heavy={",".join(results[0]["heavy"]) or "-"}')
+
+
+if __name__ == '__main__':
+    main()
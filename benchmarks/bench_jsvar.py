@@ -0,0 +1,68 @@
+"""比较 AlarmCrawler._paramJsVar 与 ast.literal_eval 解析预警列表的耗时及内存峰值
+
+用法：python -m benchmarks.bench_jsvar [--payload 文件] [--count N] [--repeat N]
+
+--payload 指定录制的 grepalarm_cn.php 响应，缺省时使用合成的预警列表（JSON 及单引号写法各一份）。
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Dict, List
+import ast
+import tracemalloc
+from weather_com_cn.alarm import AlarmCrawler
+from .fixtures import generateAlarms
+
+
+def literalEval(data: str):
+    "改动前 _paramJsVar 的实现"
+    info: List[str] = data.strip().split('=', maxsplit=1)
+    return ast.literal_eval(info[1] if info[1][-1] != ';' else info[1][:-1])
+
+
+def measure(parse: Callable[[str], object], text: str, repeat: int) -> dict:
+    times: List[float] = []
+    for _ in range(repeat):
+        start = perf_counter()
+        parse(text)
+        times.append(perf_counter() - start)
+    tracemalloc.start()
+    parse(text)
+    peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    times.sort()
+    return {'p50': times[len(times) // 2], 'min': times[0], 'peak': peak}
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--payload')
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    payloads: Dict[str, str]
+    if args.payload is None:
+        payloads = {
+            'json': generateAlarms(args.count).decode(),
+            'single-quoted': generateAlarms(args.count,
+                                            single_quoted=True).decode()
+        }
+    else:
+        payloads = {
+            Path(args.payload).name:
+            Path(args.payload).read_text(encoding='utf-8')
+        }
+    for name, text in payloads.items():
+        assert AlarmCrawler._paramJsVar(text) == literalEval(text), name
+        print(f'{name}: {len(text)} chars')
+        for parse_name, parse in (('literal_eval', literalEval),
+                                  ('_paramJsVar', AlarmCrawler._paramJsVar)):
+            result = measure(parse, text, args.repeat)
+            print(f'  {parse_name:>12}: p50 {result["p50"] * 1000:8.2f} ms  '
+                  f'min {result["min"] * 1000:8.2f} ms  '
+                  f'peak {result["peak"] / 2**20:7.2f} MiB')
+
+
+if __name__ == '__main__':
+    main()
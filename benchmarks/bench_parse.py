@@ -0,0 +1,125 @@
+"""比较各解析引擎解析天气预报页面的耗时及内存峰值，并检查结果是否一致
+
+用法：python -m benchmarks.bench_parse [--pages 目录] [--repeat N]
+
+--pages 指定录制的 textFC/*.shtml 页面所在目录，缺省时使用合成页面。
+每个引擎在独立的子进程中运行，以便分别统计进程的内存峰值（ru_maxrss）。
+"""
+from argparse import ArgumentParser
+from datetime import date
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Optional
+import json
+import resource
+import subprocess
+import sys
+import tracemalloc
+from weather_com_cn.filters import WeatherFilter
+from weather_com_cn.forecast import WeatherCrawler
+from .fixtures import generatePages
+
+FILTERS = (
+    (None, {}, None, {}),
+    ({'北京': {}, '广东': None, '河北': {'河北市1'}}, {}, None, {}),
+    (None, {'广东': {'广东市1': {'广东市1区2'}}, '北京': None}, None, {}),
+    (None, {}, {date(2020, 8, 2), date(2020, 8, 3)}, {date(2020, 8, 3)}),
+)
+
+
+def loadPages(path: Optional[str]) -> Dict[str, str]:
+    if path is None:
+        return {k: v.decode() for k, v in generatePages().items()}
+    return {
+        '/textFC/' + p.name: p.read_text(encoding='utf-8')
+        for p in sorted(Path(path).glob('*.shtml'))
+    }
+
+
+def narrowFilter(pages: Dict[str, str]) -> WeatherFilter:
+    "“仅广东、仅明天”的过滤器，用于衡量过滤器下推的效果"
+    dates = sorted({
+        w.date
+        for w in WeatherCrawler._parseWeathers(next(iter(pages.values())),
+                                               engine='lxml')
+    })
+    return WeatherFilter({'广东': None}, {}, dates[1:2], {})
+
+
+def runEngine(engine: str, pages: Dict[str, str], repeat: int) -> dict:
+    "在当前进程中以 engine 解析全部页面"
+    times: List[float] = []
+    for _ in range(repeat):
+        for text in pages.values():
+            start = perf_counter()
+            WeatherCrawler._parseWeathers(text, engine=engine)
+            times.append(perf_counter() - start)
+    narrow = narrowFilter(pages)
+    start = perf_counter()
+    for _ in range(repeat):
+        for text in pages.values():
+            WeatherCrawler._parseWeathers(text, narrow, engine=engine)
+    narrow_ms = (perf_counter() - start) / len(times) * 1000
+    # 单独统计 Python 堆的峰值，tracemalloc 会显著拖慢计时
+    # 每个页面重新开始追踪以清零峰值（reset_peak 需要 Python 3.9）
+    peak: int = 0
+    for text in pages.values():
+        tracemalloc.start()
+        WeatherCrawler._parseWeathers(text, engine=engine)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    times.sort()
+    return {
+        'engine': engine,
+        'pages': len(times),
+        'mean_ms': sum(times) / len(times) * 1000,
+        'p50_ms': times[len(times) // 2] * 1000,
+        'max_ms': times[-1] * 1000,
+        'narrow_mean_ms': narrow_ms,
+        'page_py_peak_kib': peak / 1024,
+        'maxrss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def checkParity(pages: Dict[str, str]) -> None:
+    engines = list(WeatherCrawler.ENGINES)
+    for url, text in pages.items():
+        for filters in FILTERS:
+            results = [
+                WeatherCrawler._parseWeathers(text, WeatherFilter(*filters),
+                                             engine=engine)
+                for engine in engines
+            ]
+            for engine, result in zip(engines[1:], results[1:]):
+                assert result == results[0], f'{engine} 与 {engines[0]} ' \
+                    f'解析 {url} 的结果不一致（过滤器：{filters}）'
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--pages')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--engine', help='仅在当前进程中运行该引擎（供子进程使用）')
+    args = parser.parse_args()
+
+    pages = loadPages(args.pages)
+    if args.engine:
+        print(json.dumps(runEngine(args.engine, pages, args.repeat)))
+        return
+    checkParity(pages)
+    print(f'parity ok: {len(pages)} pages x {len(FILTERS)} filters')
+    for engine in WeatherCrawler.ENGINES:
+        cmd = [sys.executable, '-m', 'benchmarks.bench_parse', '--engine',
+               engine, '--repeat', str(args.repeat)]
+        if args.pages:
+            cmd += ['--pages', args.pages]
+        result = json.loads(subprocess.check_output(cmd))
+        print('{engine:<5} pages={pages} mean={mean_ms:.2f}ms '
+              'p50={p50_ms:.2f}ms max={max_ms:.2f}ms '
+              'narrow_mean={narrow_mean_ms:.2f}ms '
+              'page_py_peak={page_py_peak_kib:.0f}KiB maxrss={maxrss_kib}KiB'.format(
+                  **result))
+
+
+if __name__ == '__main__':
+    main()
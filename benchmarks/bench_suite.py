@@ -0,0 +1,326 @@
+"""端到端及分阶段的基准测试，结果可与保存的基线比较
+
+用法：python -m benchmarks.bench_suite [--fixtures 目录] [--latency 秒] [--repeat N]
+[--engine bs4|lxml] [--baseline 文件] [--save-baseline] [--tolerance 比例]
+
+以本地替身服务器（延迟为 --latency 秒）提供录制的页面（--fixtures，见 record.py），
+缺省时使用合成页面。测试以下用例，每个用例在独立的子进程中运行，以便分别统计
+进程的内存峰值（ru_maxrss）：
+
+forecast      WeatherCrawler.getNationWideWeathers
+alarms        AlarmCrawler.getAlarms
+alarm_detail  AlarmCrawler.getAlarmDetail（每次使用空的缓存）
+location      LocationID.getNameFromID（不使用缓存）
+
+端到端的结果为吞吐量（每秒的行数或次数）及每次调用的 p50/p99 延迟；
+另对每个页面分别统计下载（fetch）、解码（decode）、解析（parse）
+及构造模型（build）各阶段的 p50/p99 及总耗时。
+
+--baseline 指定的基线文件（默认为 benchmarks/baseline.json）存在时，
+列出各项相对基线的变化；p50 延迟增加或吞吐量下降超过 --tolerance 时视为退化，
+以状态 1 退出。--save-baseline 将本次结果写入基线文件。
+
+基线与机器相关，不随代码提交，须在同一台机器上以相同的参数录制：
+先（可选）以 record.py 录制页面，再在作为参照的版本上运行
+python -m benchmarks.bench_suite [--fixtures 目录] --save-baseline，
+之后不带 --save-baseline 运行即与之比较。基线文件不存在时，
+报告录制方法并以状态 2 退出；基线的参数与本次不同时同样以状态 2 退出。
+"""
+from argparse import ArgumentParser
+from math import ceil
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, TypeVar
+import json
+import resource
+import subprocess
+import sys
+from weather_com_cn.alarm import AlarmCrawler
+from weather_com_cn.common import LocationID
+from weather_com_cn.forecast import WeatherCrawler
+from weather_com_cn.transport import decodeResponse, getDefaultTransport
+from .fixtures import generateSite, loadRecorded
+from .server import StandInServer
+
+_T = TypeVar('_T')
+CASES = ('forecast', 'alarms', 'alarm_detail', 'location')
+STAGES = ('fetch', 'decode', 'parse', 'build')
+BASELINE = str(Path(__file__).with_name('baseline.json'))
+
+
+def percentile(times: List[float], q: float) -> float:
+    "times 的 q 分位数（最近秩法），times 须已排序"
+    return times[max(0, ceil(q * len(times)) - 1)]
+
+
+class Timings():
+    "各阶段的耗时"
+
+    def __init__(self):
+        self.times: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+
+    def run(self, stage: str, func: Callable[..., _T], *args) -> _T:
+        start = perf_counter()
+        result = func(*args)
+        self.times[stage].append(perf_counter() - start)
+        return result
+
+    def summary(self) -> Dict[str, dict]:
+        result: Dict[str, dict] = {}
+        for stage, times in self.times.items():
+            if times:
+                times = sorted(times)
+                result[stage] = {
+                    'count': len(times),
+                    'p50_ms': percentile(times, 0.5) * 1000,
+                    'p99_ms': percentile(times, 0.99) * 1000,
+                    'total_ms': sum(times) * 1000,
+                }
+        return result
+
+
+def alarmCrawler(base_url: str) -> AlarmCrawler:
+    "从替身服务器获取预警的 AlarmCrawler"
+    class Crawler(AlarmCrawler):
+        url = base_url + '/alarm/grepalarm_cn.php'
+
+        @staticmethod
+        def shortUrlToCompleted(url: str) -> str:
+            return f'{base_url}/alarm/webdata/{url}'
+
+    return Crawler()
+
+
+def locationID(base_url: str) -> LocationID:
+    "从替身服务器获取编号表的 LocationID"
+    class Location(LocationID):
+        @staticmethod
+        def provincesUrl() -> str:
+            return f'{base_url}/data/city3jdata/china.html'
+
+        @staticmethod
+        def citiesUrl(province_id: int) -> str:
+            return f'{base_url}/data/city3jdata/provshi/{province_id}.html'
+
+        @staticmethod
+        def districtsUrl(city_id: int) -> str:
+            return f'{base_url}/data/city3jdata/station/{city_id}.html'
+
+    return Location()
+
+
+def fetch(url: str):
+    resp = getDefaultTransport().get(url)
+    resp.raise_for_status()
+    return resp
+
+
+def benchForecast(base_url: str, repeat: int, engine: str):
+    def crawler() -> WeatherCrawler:
+        crawler = WeatherCrawler(engine=engine, page_ttl=0)
+        crawler.base_url = base_url
+        crawler.url = base_url + '/textFC/hb.shtml'
+        return crawler
+
+    latencies: List[float] = []
+    rows: int = 0
+    for _ in range(repeat):
+        start = perf_counter()
+        rows += len(crawler().getNationWideWeathers())
+        latencies.append(perf_counter() - start)
+    timings = Timings()
+    build = getattr(WeatherCrawler, WeatherCrawler.OUTPUTS['model'])
+    for _ in range(repeat):
+        for u in crawler().getAreasList().values():
+            resp = timings.run('fetch', fetch, base_url + u)
+            text = timings.run('decode', decodeResponse, resp)
+            page_rows = timings.run(
+                'parse', lambda: list(
+                    WeatherCrawler._iterPageRows(text, None, engine)))
+            timings.run('build', lambda: [build(row) for row in page_rows])
+    return latencies, rows, timings
+
+
+def benchAlarms(base_url: str, repeat: int, engine: str):
+    crawler = alarmCrawler(base_url)
+    latencies: List[float] = []
+    alarms: int = 0
+    for _ in range(repeat):
+        start = perf_counter()
+        alarms += len(crawler.getAlarms())
+        latencies.append(perf_counter() - start)
+    timings = Timings()
+    build = AlarmCrawler._ALARM_BUILDERS['model']
+    for _ in range(repeat):
+        resp = timings.run('fetch', fetch, crawler.url)
+        text = timings.run('decode', decodeResponse, resp)
+        data = timings.run('parse', AlarmCrawler._paramJsVar, text)['data']
+        timings.run(
+            'build',
+            lambda: [AlarmCrawler._buildAlarm(alarm_l, build)
+                     for alarm_l in data])
+    return latencies, alarms, timings
+
+
+def benchAlarmDetail(base_url: str, repeat: int, engine: str):
+    short_urls: List[str] = [
+        alarm.short_url for alarm in alarmCrawler(base_url).getAlarms()[:50]
+    ]
+    latencies: List[float] = []
+    for _ in range(repeat):
+        crawler = alarmCrawler(base_url)
+        for short_url in short_urls:
+            start = perf_counter()
+            crawler.getAlarmDetail(short_url)
+            latencies.append(perf_counter() - start)
+    timings = Timings()
+    for _ in range(repeat):
+        for short_url in short_urls:
+            resp = timings.run('fetch', fetch,
+                               crawler.shortUrlToCompleted(short_url))
+            text = timings.run('decode', decodeResponse, resp)
+            info = timings.run('parse', AlarmCrawler._paramJsVar, text)
+            timings.run('build', AlarmCrawler._buildAlarmDetail, info)
+    return latencies, len(latencies), timings
+
+
+def benchLocation(base_url: str, repeat: int, engine: str):
+    location = locationID(base_url)
+    ids: List[int] = []
+    for province_id in location.getProvincesIDs().values():
+        for city_id in location.getCitiesIDs(province_id).values():
+            ids.append(city_id)
+    # 每个市取其第一个区县，至多 50 个
+    ids = ids[::max(1, len(ids) // 50)][:50]
+    ids = [next(iter(location.getDistrictsIDs(id_).values()), id_)
+           for id_ in ids]
+    latencies: List[float] = []
+    for _ in range(repeat):
+        location = locationID(base_url)
+        for id_ in ids:
+            start = perf_counter()
+            assert location.getNameFromID(id_), id_
+            latencies.append(perf_counter() - start)
+    timings = Timings()
+    for _ in range(repeat):
+        for id_ in ids:
+            resp = timings.run('fetch', fetch,
+                               location.districtsUrl(id_ // 100))
+            text = timings.run('decode', decodeResponse, resp)
+            timings.run('parse', LocationID._parseIDs, text, id_ // 100)
+    return latencies, len(latencies), timings
+
+
+BENCHES: Dict[str, Callable] = {
+    'forecast': benchForecast,
+    'alarms': benchAlarms,
+    'alarm_detail': benchAlarmDetail,
+    'location': benchLocation,
+}
+
+
+def runCase(case: str, base_url: str, repeat: int, engine: str) -> dict:
+    "在当前进程中运行用例 case"
+    latencies, items, timings = BENCHES[case](base_url, repeat, engine)
+    latencies.sort()
+    return {
+        'case': case,
+        'calls': len(latencies),
+        'items': items,
+        'throughput': items / sum(latencies),
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'stages': timings.summary(),
+        'maxrss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict],
+            tolerance: float) -> List[str]:
+    "列出各项相对基线的变化，返回退化的项"
+    regressions: List[str] = []
+    for case, result in results.items():
+        base: Optional[dict] = baseline.get(case)
+        if base is None:
+            continue
+        changes: List[str] = []
+        for key in ('throughput', 'p50_ms', 'p99_ms', 'maxrss_kib'):
+            change = result[key] / base[key] - 1
+            changes.append(f'{key}={change:+.1%}')
+            worse = -change if key == 'throughput' else change
+            if key in ('throughput', 'p50_ms') and worse > tolerance:
+                regressions.append(f'{case}.{key}')
+        print(f'{case:<13} vs baseline: ' + ' '.join(changes))
+    return regressions
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--fixtures')
+    parser.add_argument('--latency', type=float, default=0.01)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--engine', default='bs4',
+                        choices=tuple(WeatherCrawler.ENGINES))
+    parser.add_argument('--cases', default=','.join(CASES))
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    parser.add_argument('--case', help='仅在当前进程中运行该用例（供子进程使用）')
+    parser.add_argument('--base-url', help='替身服务器的地址（供子进程使用）')
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(
+            runCase(args.case, args.base_url, args.repeat, args.engine)))
+        return
+    params: Dict[str, object] = {
+        'fixtures': args.fixtures,
+        'latency': args.latency,
+        'repeat': args.repeat,
+        'engine': args.engine
+    }
+    baseline: Optional[dict] = None
+    if not args.save_baseline:
+        # 先检查基线，以免运行完整个测试后才失败
+        if not Path(args.baseline).exists():
+            print(f'no baseline: {args.baseline}\n'
+                  'record one on this machine with the same options and '
+                  '--save-baseline (see python -m benchmarks.bench_suite -h)',
+                  file=sys.stderr)
+            sys.exit(2)
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get('params') != params:
+            print(f'baseline {args.baseline} was recorded with '
+                  f'{baseline.get("params")}, not {params}; '
+                  'record it again with --save-baseline',
+                  file=sys.stderr)
+            sys.exit(2)
+    pages = generateSite() if args.fixtures is None else loadRecorded(
+        args.fixtures)
+    results: Dict[str, dict] = {}
+    with StandInServer(pages, latency=args.latency) as server:
+        for case in args.cases.split(','):
+            cmd = [sys.executable, '-m', 'benchmarks.bench_suite', '--case',
+                   case, '--base-url', server.base_url, '--repeat',
+                   str(args.repeat), '--engine', args.engine]
+            result = results[case] = json.loads(subprocess.check_output(cmd))
+            print('{case:<13} items={items} calls={calls} '
+                  'throughput={throughput:.1f}/s p50={p50_ms:.2f}ms '
+                  'p99={p99_ms:.2f}ms maxrss={maxrss_kib}KiB'.format(**result))
+            for stage, s in result['stages'].items():
+                print(f'  {stage:<7} n={s["count"]} p50={s["p50_ms"]:.3f}ms '
+                      f'p99={s["p99_ms"]:.3f}ms total={s["total_ms"]:.1f}ms')
+    if baseline is None:
+        Path(args.baseline).write_text(
+            json.dumps({'params': params, 'results': results}, indent=1))
+        print(f'baseline saved: {args.baseline}')
+        return
+    regressions: List[str] = compare(results, baseline['results'],
+                                     args.tolerance)
+    if regressions:
+        print('regressions: ' + ', '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
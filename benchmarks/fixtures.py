@@ -0,0 +1,256 @@
+"""生成与 weather.com.cn 页面结构一致的离线样本
+
+无法访问 weather.com.cn 时，基准测试使用这些合成页面代替录制的页面。
+"""
+from datetime import datetime, timedelta
+from pathlib import Path
+from random import Random
+from typing import Dict, List, Tuple
+import json
+
+WEEKDAYS = ('周一', '周二', '周三', '周四', '周五', '周六', '周日')
+EVENTS = ('晴', '多云', '阴', '小雨', '中雨', '大雨', '雷阵雨', '阵雨', '小雪', '雾')
+WIND_DIRS = ('北风', '东北风', '东风', '东南风', '南风', '西南风', '西风', '西北风', '无持续风向')
+WIND_SCALES = ('<3级', '3-4级', '4-5级', '5-6级')
+
+# 区域页面 -> [(省, 省页面, 省编号)]
+AREAS: Dict[str, Tuple[str, List[Tuple[str, str, str]]]] = {
+    'hb': ('华北', [('北京', 'beijing', '10101'), ('天津', 'tianjin', '10103'),
+                  ('河北', 'hebei', '10109'), ('山西', 'shanxi', '10110'),
+                  ('内蒙古', 'neimenggu', '10108')]),
+    'db': ('东北', [('辽宁', 'liaoning', '10107'), ('吉林', 'jilin', '10106'),
+                  ('黑龙江', 'heilongjiang', '10105')]),
+    'hd': ('华东', [('上海', 'shanghai', '10102'), ('江苏', 'jiangsu', '10119'),
+                  ('浙江', 'zhejiang', '10121'), ('安徽', 'anhui', '10122'),
+                  ('福建', 'fujian', '10123'), ('江西', 'jiangxi', '10124'),
+                  ('山东', 'shandong', '10112')]),
+    'hz': ('华中', [('河南', 'henan', '10118'), ('湖北', 'hubei', '10120'),
+                  ('湖南', 'hunan', '10125')]),
+    'hn': ('华南', [('广东', 'guangdong', '10128'), ('广西', 'guangxi', '10130'),
+                  ('海南', 'hainan', '10131')]),
+    'xb': ('西北', [('陕西', 'shaanxi', '10111'), ('甘肃', 'gansu', '10116'),
+                  ('青海', 'qinghai', '10115'), ('宁夏', 'ningxia', '10117'),
+                  ('新疆', 'xinjiang', '10113')]),
+    'xn': ('西南', [('重庆', 'chongqing', '10104'), ('四川', 'sichuan', '10127'),
+                  ('贵州', 'guizhou', '10126'), ('云南', 'yunnan', '10129'),
+                  ('西藏', 'xizang', '10114')]),
+    'gat': ('港澳台', [('香港', 'xianggang', '10132'), ('澳门', 'aomen', '10133'),
+                    ('台湾', 'taiwan', '10134')]),
+}
+PROVINCIAL_CITIES = {'香港', '澳门', '重庆', '北京', '天津', '上海'}
+
+
+def _wind(rnd: Random) -> str:
+    return (f'<span>{rnd.choice(WIND_DIRS)}</span>'
+            f'<span class="conMidtabright">'
+            f'{rnd.choice(WIND_SCALES).replace("<", "&lt;")}</span>')
+
+
+def _row(rnd: Random, name: str, id_: str, head: str = '',
+         no_day: bool = False) -> str:
+    temp_min = rnd.randint(-20, 28)
+    if no_day:
+        day = '<td>-</td><td>-</td><td>-</td>'
+    else:
+        day = (f'<td width="89">{rnd.choice(EVENTS)}</td>'
+               f'<td width="162">{_wind(rnd)}</td>'
+               f'<td width="92">{temp_min + rnd.randint(0, 12)}</td>')
+    return ('<tr>' + head +
+            f'<td width="83" height="23"><a href="http://www.weather.com.cn'
+            f'/weather/{id_}.shtml" target="_blank">{name}</a></td>' + day +
+            f'<td width="98">{rnd.choice(EVENTS)}</td>'
+            f'<td width="177">{_wind(rnd)}</td>'
+            f'<td width="86">{temp_min}</td>'
+            f'<td width="49"><a href="http://www.weather.com.cn/weather/'
+            f'{id_}.shtml" target="_blank">详情</a></td></tr>\n')
+
+
+def _table_head(first: str, day_title: str) -> str:
+    return ('<tr><td width="74" rowspan="2" class="">' + first + '</td>'
+            '<td width="83" rowspan="2">城市</td>'
+            f'<td colspan="3">{day_title}白天</td>'
+            f'<td colspan="3">{day_title}夜间</td>'
+            '<td width="49" rowspan="2"></td></tr>\n'
+            '<tr><td>天气现象</td><td>风向风力</td><td>最高气温</td>'
+            '<td>天气现象</td><td>风向风力</td><td>最低气温</td></tr>\n')
+
+
+def _page(title_a: str, title_href: str, update_time: datetime,
+          tables: List[List[Tuple[str, str]]], heads: List[Tuple[str, str]],
+          rnd: Random) -> str:
+    "tables：各表格的 (名称, 编号) 行；heads：各表格左侧表头 (名称, 链接)"
+    dates = [update_time.date() + timedelta(days=i) for i in range(7)]
+    titles = [f'{WEEKDAYS[d.weekday()]}({d.month}月{d.day}日)' for d in dates]
+    nav = ''.join(
+        f'<a href="/textFC/{page}.shtml" target="_blank">{name}</a>'
+        for _, (_, provs) in AREAS.items() for name, page, _ in provs)
+    areas = ''.join(f'<li><a href="/textFC/{key}.shtml">{name}</a></li>'
+                    for key, (name, _) in AREAS.items())
+    parts = [
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        '<title>天气预报</title></head><body>\n',
+        f'<div class="lqcontentBoxheader">{nav}</div>\n',
+        f'<ul class="lq_contentboxTab2">{areas}</ul>\n',
+        '<div class="contentboxTab"><h1><a href="', title_href,
+        '" target="_blank">', title_a, '</a><span>更新时间：',
+        update_time.strftime('%Y-%m-%d %H:%M'), '</span></h1>\n',
+        '<ul class="day_tabs">',
+        ''.join(f'<li>{t}</li>' for t in titles), '</ul>\n',
+        '<div class="hanml">\n'
+    ]
+    for n, title in enumerate(titles):
+        parts.append('<div class="conMidtab"%s>\n' %
+                     ('' if n == 0 else ' style="display:none;"'))
+        for (head_name, head_href), rows in zip(heads, tables):
+            parts.append('<div class="conMidtab2"><table width="100%">\n')
+            parts.append(_table_head('省/直辖市', title))
+            for m, (name, id_) in enumerate(rows):
+                head = ''
+                if m == 0:
+                    link = (f'<a href="{head_href}" target="_blank">'
+                            f'{head_name}</a>' if head_href else head_name)
+                    head = (f'<td width="74" rowspan="{len(rows)}" '
+                            f'class="rowsPan">{link}</td>')
+                parts.append(
+                    _row(rnd, name, id_, head, no_day=(n == 0 and m % 5 == 4)))
+            parts.append('</table></div>\n')
+        parts.append('</div>\n')
+    parts.append('</div></div></body></html>\n')
+    return ''.join(parts)
+
+
+def generatePages(update_time: datetime = datetime(2020, 8, 1, 18, 0),
+                  cities_per_province: int = 12,
+                  districts_per_city: int = 8,
+                  seed: int = 0) -> Dict[str, bytes]:
+    "生成全部区域页面及省级页面，返回 {路径: 内容}"
+    rnd = Random(seed)
+    pages: Dict[str, bytes] = {}
+    for key, (area_name, provs) in AREAS.items():
+        tables: List[List[Tuple[str, str]]] = []
+        heads: List[Tuple[str, str]] = []
+        for prov_name, prov_page, prov_id in provs:
+            rows = [(prov_name if n == 0 else f'{prov_name}市{n}',
+                     f'{prov_id}{n + 1:02d}00')
+                    for n in range(cities_per_province)]
+            tables.append(rows)
+            heads.append((prov_name, f'/textFC/{prov_page}.shtml'))
+            # 省级页面：每个市一个表格
+            city_tables = []
+            city_heads = []
+            for n, (city_name, city_id) in enumerate(rows):
+                city_tables.append([
+                    (city_name if m == 0 else f'{city_name}区{m}',
+                     city_id[:-2] + f'{m + 1:02d}')
+                    for m in range(districts_per_city)
+                ])
+                city_heads.append((city_name, ''))
+            pages[f'/textFC/{prov_page}.shtml'] = _page(
+                prov_name, f'/textFC/{prov_page}.shtml', update_time,
+                city_tables, city_heads, rnd).encode()
+        pages[f'/textFC/{key}.shtml'] = _page(area_name, f'/textFC/{key}.shtml',
+                                              update_time, tables, heads,
+                                              rnd).encode()
+    return pages
+
+
+ALARM_KINDS = (1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 91, 92, 93, 94)
+
+
+def generateAlarms(count: int = 2000,
+                   update_time: datetime = datetime(2020, 8, 1, 18, 0),
+                   seed: int = 0,
+                   single_quoted: bool = False) -> bytes:
+    """生成与 grepalarm_cn.php 结构一致的预警列表
+
+    single_quoted 为 True 时以 Python 字面量（单引号）的写法生成，用于测试非 JSON 的情形
+    """
+    rnd = Random(seed)
+    provinces = [(name, id_) for _, provs in AREAS.values()
+                 for name, _, id_ in provs]
+    data: List[List[str]] = []
+    for n in range(count):
+        prov_name, prov_id = rnd.choice(provinces)
+        time = update_time - timedelta(minutes=rnd.randint(0, 3 * 24 * 60))
+        data.append([
+            f'{prov_name}省{prov_name}市{n}区',
+            f'{prov_id}{rnd.randint(1, 20):02d}{rnd.randint(1, 12):02d}-'
+            f'{time:%Y%m%d%H%M%S}-'
+            f'{rnd.choice(ALARM_KINDS):02d}{rnd.randint(1, 4):02d}.html',
+            f'{rnd.uniform(73, 135):.6f}', f'{rnd.uniform(18, 53):.6f}'
+        ])
+    value = {'count': str(count), 'data': data}
+    text = repr(value) if single_quoted else json.dumps(value,
+                                                        ensure_ascii=False)
+    return f'var alarminfo={text};'.encode()
+
+
+def generateAlarmDetail(short_url: str, seed: int = 0) -> bytes:
+    "生成与 alarm/webdata/ 下的预警详情结构一致的内容"
+    rnd = Random(f'{seed}:{short_url}')
+    location_id, time_str, code = short_url[:-5].split('-')
+    time = datetime.strptime(time_str, '%Y%m%d%H%M%S')
+    info = {
+        'head': f'{location_id}气象台发布预警',
+        'ALERTID': f'{location_id}{time_str}{code}',
+        'PROVINCE': '某省',
+        'CITY': f'{location_id}',
+        'ISSUETIME': f'{time:%Y-%m-%d %H:%M}',
+        'ISSUECONTENT': '，'.join(rnd.choices(EVENTS, k=40)) + '。',
+        'RELIEVETIME': f'{time + timedelta(days=1):%Y-%m-%d %H:%M}',
+        'TYPECODE': code[:2],
+        'LEVELCODE': code[2:],
+        'NAME': '预警',
+    }
+    return f'var alarmDZ={json.dumps(info, ensure_ascii=False)}'.encode()
+
+
+def generateCityData(cities_per_province: int = 12,
+                     districts_per_city: int = 8) -> Dict[str, bytes]:
+    "生成与 generatePages 的地区一致的 city3jdata 编号表，返回 {路径: 内容}"
+    pages: Dict[str, bytes] = {}
+    provinces: Dict[str, str] = {}
+    for _, provs in AREAS.values():
+        for prov_name, _, prov_id in provs:
+            provinces[prov_id] = prov_name
+            cities: Dict[str, str] = {}
+            for n in range(cities_per_province):
+                city_name = prov_name if n == 0 else f'{prov_name}市{n}'
+                cities[f'{n + 1:02d}'] = city_name
+                pages[f'/data/city3jdata/station/{prov_id}{n + 1:02d}.html'] = \
+                    json.dumps({
+                        f'{m + 1:02d}':
+                        city_name if m == 0 else f'{city_name}区{m}'
+                        for m in range(districts_per_city)
+                    }, ensure_ascii=False).encode()
+            pages[f'/data/city3jdata/provshi/{prov_id}.html'] = json.dumps(
+                cities, ensure_ascii=False).encode()
+    pages['/data/city3jdata/china.html'] = json.dumps(
+        provinces, ensure_ascii=False).encode()
+    return pages
+
+
+def generateSite(alarms: int = 2000, seed: int = 0) -> Dict[str, bytes]:
+    """生成基准测试用到的全部页面，返回 {路径: 内容}
+
+    包括 textFC/*.shtml、alarm/grepalarm_cn.php、alarm/webdata/ 下的预警详情
+    及 data/city3jdata/ 下的编号表，路径与 weather.com.cn 上的一致
+    """
+    pages: Dict[str, bytes] = generatePages(seed=seed)
+    pages.update(generateCityData())
+    alarm_list: bytes = generateAlarms(alarms, seed=seed)
+    pages['/alarm/grepalarm_cn.php'] = alarm_list
+    for _, short_url, _, _ in json.loads(
+            alarm_list.decode().split('=', 1)[1][:-1])['data']:
+        pages[f'/alarm/webdata/{short_url}'] = generateAlarmDetail(
+            short_url, seed)
+    return pages
+
+
+def loadRecorded(path: str) -> Dict[str, bytes]:
+    "读取 record.py 录制的页面，目录结构与网址的路径一致，返回 {路径: 内容}"
+    root = Path(path)
+    return {
+        '/' + p.relative_to(root).as_posix(): p.read_bytes()
+        for p in sorted(root.rglob('*')) if p.is_file()
+    }
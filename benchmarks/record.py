@@ -0,0 +1,63 @@
+"""录制 weather.com.cn 上的页面，供基准测试离线使用
+
+用法：python -m benchmarks.record 目录 [--details N] [--cities N]
+
+录制全部 textFC/*.shtml 页面、grepalarm_cn.php、前 N 个预警详情，
+以及 city3jdata 中的省级、前 N 个省的市级及区县级编号表。
+文件按网址的路径保存于目录中，可由 fixtures.loadRecorded 读取。
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+from urllib.parse import urlsplit
+from weather_com_cn.alarm import AlarmCrawler
+from weather_com_cn.common import LocationID
+from weather_com_cn.forecast import WeatherCrawler
+from weather_com_cn.transport import getDefaultTransport
+
+
+def save(root: Path, url: str) -> bytes:
+    "下载 url 并按其路径保存于 root 中，404 时不保存并返回 b''"
+    resp = getDefaultTransport().get(url)
+    if resp.status_code == 404:
+        return b''
+    resp.raise_for_status()
+    path = root / urlsplit(url).path.lstrip('/')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(resp.content)
+    return resp.content
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('path')
+    parser.add_argument('--details', type=int, default=50)
+    parser.add_argument('--cities', type=int, default=3, help='录制市级编号表的省数')
+    args = parser.parse_args()
+    root = Path(args.path)
+
+    crawler = WeatherCrawler()
+    urls = {crawler.url, *(crawler.base_url + u for u in (
+        *crawler.getAreasList().values(),
+        *crawler.getProvincesList().values()))}
+    for url in sorted(urls):
+        save(root, url)
+    print(f'forecast pages: {len(urls)}')
+
+    alarm_crawler = AlarmCrawler()
+    save(root, alarm_crawler.url)
+    alarms = alarm_crawler.getAlarms()[:args.details]
+    for alarm in alarms:
+        save(root, AlarmCrawler.shortUrlToCompleted(alarm.short_url))
+    print(f'alarm details: {len(alarms)}')
+
+    save(root, LocationID.provincesUrl())
+    location = LocationID()
+    for province_id in list(location.getProvincesIDs().values())[:args.cities]:
+        save(root, LocationID.citiesUrl(province_id))
+        for city_id in location.getCitiesIDs(province_id).values():
+            save(root, LocationID.districtsUrl(city_id))
+    print(f'city3jdata: {args.cities} provinces')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""本地 HTTP 替身服务器，用于离线基准测试"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import Dict, Optional
+import hashlib
+import sys
+import time
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address) -> None:
+        # 客户端提前断开（如只读取页面头部）是正常情况
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StandInServer():
+    """在本地端口上以固定延迟提供给定的页面
+
+    响应附带由内容计算的 ETag；etag 为 True 时，对匹配的 If-None-Match 返回 304
+    """
+
+    def __init__(self,
+                 pages: Dict[str, bytes],
+                 latency: float = 0.0,
+                 content_type: str = 'text/html; charset=utf-8',
+                 etag: bool = False):
+        self.pages = pages
+        self.latency = latency
+        self.content_type = content_type
+        self.etag = etag
+        self.requests_count = 0
+        self._httpd: Optional[_QuietServer] = None
+
+    @property
+    def base_url(self) -> str:
+        assert self._httpd is not None
+        return f'http://127.0.0.1:{self._httpd.server_address[1]}'
+
+    def start(self) -> 'StandInServer':
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # 响应头与内容分两次写出，避免 Nagle 算法与延迟确认叠加造成的等待
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                server.requests_count += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                body = server.pages.get(self.path.split('?', 1)[0])
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if server.etag and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Type', server.content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = _QuietServer(('127.0.0.1', 0), Handler)
+        Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self) -> 'StandInServer':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
@@ -1,2 +1,14 @@
-from . import alarm, model, forecast, common
-__all__ = ('alarm', 'model', 'forecast', 'common')
+"各子模块在首次访问时才导入，只用到部分功能时不必导入其余的依赖"
+from importlib import import_module
+__all__ = ('alarm', 'model', 'forecast', 'common', 'filters', 'index',
+           'transport', 'snapshot', 'instrument', 'history')
+
+
+def __getattr__(name: str):
+    if name in __all__:
+        return import_module(f'{__name__}.{name}')
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted({*globals(), *__all__})
@@ -0,0 +1,387 @@
+"基于 asyncio 及 aiohttp 的异步爬虫，接口与同步版本一致"
+import asyncio
+from collections import deque
+from concurrent.futures import Executor
+from datetime import date
+from typing import (Any, AsyncIterator, Callable, Deque, Dict, Iterable, List,
+                    Optional, Tuple, TypeVar, Union)
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from .alarm import AlarmCrawler, AlarmDetailCache
+from .common import LocationCache, LocationID, LocationTable
+from .filters import WeatherFilter
+from .forecast import WeatherCrawler
+from .model import Alarm, AlarmDetail, AlarmRecord, Weather
+from .transport import EncodingStrategy
+
+__all__ = ('AsyncWeatherCrawler', 'AsyncAlarmCrawler', 'AsyncLocationID')
+
+_R = TypeVar('_R')
+
+
+class _AsyncClient():
+    "异步爬虫的公共部分：管理带连接池及 keep-alive 的 ClientSession"
+    session: Optional[ClientSession]
+    encodings: EncodingStrategy
+
+    def __init__(self,
+                 session: Optional[ClientSession] = None,
+                 limit: int = 100,
+                 limit_per_host: int = 32,
+                 keepalive_timeout: float = 30,
+                 timeout: float = 30,
+                 encodings: Optional[EncodingStrategy] = None):
+        """session 为 None 时，在首次请求时创建 ClientSession
+
+        limit、limit_per_host 为连接池大小，keepalive_timeout 为空闲连接的
+        保持时间，timeout 为单个请求的总超时时间（秒），
+        encodings 为确定响应编码的 EncodingStrategy
+        """
+        self.session = session
+        self.encodings = encodings if encodings else EncodingStrategy()
+        self._own_session: bool = session is None
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._keepalive_timeout = keepalive_timeout
+        self._timeout = timeout
+
+    def getSession(self) -> ClientSession:
+        "获取 ClientSession，需在事件循环中调用"
+        if self.session is None or self.session.closed:
+            self.session = ClientSession(
+                connector=TCPConnector(
+                    limit=self._limit,
+                    limit_per_host=self._limit_per_host,
+                    keepalive_timeout=self._keepalive_timeout),
+                timeout=ClientTimeout(total=self._timeout))
+            self._own_session = True
+        return self.session
+
+    async def close(self) -> None:
+        "关闭由本对象创建的 ClientSession"
+        if self._own_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def _get(self, url: str) -> Tuple[int, str]:
+        "GET 请求，返回状态码及按 encodings 解码的内容"
+        async with self.getSession().get(url) as resp:
+            body: bytes = await resp.read()
+            return resp.status, self.encodings.decode(
+                url, body, resp.headers.get('Content-Type'))[0]
+
+
+async def _run(executor: Optional[Executor], func: Callable[..., _R],
+               *args: Any) -> _R:
+    "在 executor 中执行 CPU 密集的解析，executor 为 None 时直接执行"
+    if executor is None:
+        return func(*args)
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, func, *args)
+
+
+class AsyncWeatherCrawler(_AsyncClient):
+    "国内天气预报爬虫（异步）"
+    base_url: str = WeatherCrawler.base_url
+    url: str = WeatherCrawler.url
+    filterWeathers = staticmethod(WeatherCrawler.filterWeathers)
+    engine: str
+    output: str
+
+    def __init__(self,
+                 session: Optional[ClientSession] = None,
+                 engine: str = 'bs4',
+                 output: str = 'model',
+                 **kwargs):
+        "engine、output 同 WeatherCrawler，其余参数同 _AsyncClient"
+        if engine not in WeatherCrawler.ENGINES:
+            raise ValueError(f'unknown engine: {engine!r}')
+        if output not in WeatherCrawler.OUTPUTS:
+            raise ValueError(f'unknown output: {output!r}')
+        super().__init__(session, **kwargs)
+        self.engine = engine
+        self.output = output
+
+    async def getProvincesList(self) -> Dict[str, str]:
+        return WeatherCrawler._parseProvincesList(
+            (await self._get(self.url))[1])
+
+    async def getAreasList(self) -> Dict[str, str]:
+        return WeatherCrawler._parseAreasList((await self._get(self.url))[1])
+
+    async def getNationWideWeathers(
+            self,
+            districts_included: Optional[Union[dict, list]] = None,
+            districts_excluded: Union[dict, list] = {},
+            dates_included: Optional[Iterable[date]] = None,
+            dates_excluded: Iterable[date] = {},
+            weather_filter: Optional[WeatherFilter] = None,
+            max_in_flight: int = 8,
+            parse_executor: Optional[Executor] = None) -> List[Weather]:
+        return await self.getWeathers((await self.getAreasList()).values(),
+                                      districts_included, districts_excluded,
+                                      dates_included, dates_excluded,
+                                      weather_filter, max_in_flight,
+                                      parse_executor)
+
+    async def iterNationWideWeathers(
+        self,
+        districts_included: Optional[Union[dict, list]] = None,
+        districts_excluded: Union[dict, list] = {},
+        dates_included: Optional[Iterable[date]] = None,
+        dates_excluded: Iterable[date] = {},
+        weather_filter: Optional[WeatherFilter] = None,
+        max_in_flight: int = 8,
+        parse_executor: Optional[Executor] = None,
+        batches: bool = False
+    ) -> AsyncIterator[Union[Weather, List[Weather]]]:
+        async for weathers in self.iterWeathers(
+                (await self.getAreasList()).values(), districts_included,
+                districts_excluded, dates_included, dates_excluded,
+                weather_filter, max_in_flight, parse_executor, batches):
+            yield weathers
+
+    async def getWeathers(
+            self,
+            url: Union[str, Iterable[str]],
+            districts_included: Optional[Union[dict, list]] = None,
+            districts_excluded: Union[dict, list] = {},
+            dates_included: Optional[Iterable[date]] = None,
+            dates_excluded: Iterable[date] = {},
+            weather_filter: Optional[WeatherFilter] = None,
+            max_in_flight: int = 8,
+            parse_executor: Optional[Executor] = None) -> List[Weather]:
+        """获取天气预报
+
+        url 为多个页面时并发获取，同时进行中的页面不超过 max_in_flight 个；
+        解析默认在事件循环中进行，可传入 parse_executor 交给其执行。
+        返回结果的顺序与 url 的顺序一致。
+        """
+        weathers: List[Weather] = []
+        async for page_weathers in self.iterWeathers(
+                url, districts_included, districts_excluded, dates_included,
+                dates_excluded, weather_filter, max_in_flight, parse_executor,
+                True):
+            if isinstance(page_weathers, list):
+                weathers.extend(page_weathers)
+            else:
+                weathers.append(page_weathers)
+        return weathers
+
+    async def iterWeathers(
+        self,
+        url: Union[str, Iterable[str]],
+        districts_included: Optional[Union[dict, list]] = None,
+        districts_excluded: Union[dict, list] = {},
+        dates_included: Optional[Iterable[date]] = None,
+        dates_excluded: Iterable[date] = {},
+        weather_filter: Optional[WeatherFilter] = None,
+        max_in_flight: int = 8,
+        parse_executor: Optional[Executor] = None,
+        batches: bool = False
+    ) -> AsyncIterator[Union[Weather, List[Weather]]]:
+        """按 url 的顺序，以页面为单位逐个产出天气预报，参数同 getWeathers
+
+        同时保留的页面不超过 max_in_flight 个；
+        batches 为 True 时产出各页面 Weather 的列表，否则逐个产出 Weather
+        """
+        flt: WeatherFilter = WeatherCrawler._compileFilter(
+            districts_included, districts_excluded, dates_included,
+            dates_excluded, weather_filter)
+
+        async def getPage(u: str) -> List[Weather]:
+            text: str = (await self._get(self.base_url + u))[1]
+            return await _run(parse_executor, WeatherCrawler._parseWeathers,
+                              text, flt, self.engine, self.output)
+
+        urls: Iterable[str] = [url] if isinstance(url, str) else url
+        pending: Deque[asyncio.Task] = deque()
+        try:
+            for u in urls:
+                if len(pending) >= max(max_in_flight, 1):
+                    page_weathers: List[Weather] = await pending.popleft()
+                    if batches:
+                        yield page_weathers
+                    else:
+                        for weather in page_weathers:
+                            yield weather
+                pending.append(asyncio.ensure_future(getPage(u)))
+            while pending:
+                page_weathers = await pending.popleft()
+                if batches:
+                    yield page_weathers
+                else:
+                    for weather in page_weathers:
+                        yield weather
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+class AsyncAlarmCrawler(_AsyncClient):
+    "气象预警爬虫（异步）"
+    url: str = AlarmCrawler.url
+    TIMEZONE = AlarmCrawler.TIMEZONE
+    shortUrlToCompleted = staticmethod(AlarmCrawler.shortUrlToCompleted)
+    shortUrlToHuman = staticmethod(AlarmCrawler.shortUrlToHuman)
+    output: str
+    detail_cache: AlarmDetailCache
+
+    def __init__(self,
+                 session: Optional[ClientSession] = None,
+                 output: str = 'model',
+                 detail_cache: Optional[AlarmDetailCache] = None,
+                 **kwargs):
+        "output、detail_cache 同 AlarmCrawler，其余参数同 _AsyncClient"
+        if output not in AlarmCrawler.OUTPUTS:
+            raise ValueError(f'unknown output: {output!r}')
+        super().__init__(session, **kwargs)
+        self.output = output
+        self.detail_cache = detail_cache if detail_cache \
+            else AlarmDetailCache()
+
+    async def getAlarms(self) -> List[Union[Alarm, AlarmRecord]]:
+        return AlarmCrawler._parseAlarms((await self._get(self.url))[1],
+                                         self.output)
+
+    async def getAlarmDetail(self, short_url: str) -> AlarmDetail:
+        detail: Optional[AlarmDetail] = self.detail_cache.get(short_url)
+        if detail is None:
+            text: str = (await self._get(self.shortUrlToCompleted(short_url)))[1]
+            detail = AlarmCrawler._parseAlarmDetail(text)
+            self.detail_cache.put(short_url, text, detail)
+        return detail
+
+    async def getAlarmDetails(self,
+                              short_urls: Iterable[str],
+                              max_in_flight: int = 8) -> List[AlarmDetail]:
+        "同 AlarmCrawler.getAlarmDetails，同时进行中的请求不超过 max_in_flight 个"
+        semaphore = asyncio.Semaphore(max(max_in_flight, 1))
+
+        async def getDetail(short_url: str) -> AlarmDetail:
+            async with semaphore:
+                return await self.getAlarmDetail(short_url)
+
+        short_urls = list(short_urls)
+        unique: List[str] = list(dict.fromkeys(short_urls))
+        details: Dict[str, AlarmDetail] = dict(
+            zip(unique, await asyncio.gather(*map(getDetail, unique))))
+        return [details[short_url] for short_url in short_urls]
+
+
+class AsyncLocationID(_AsyncClient):
+    "地区编号查询（异步）"
+    isHaveCommonArea = staticmethod(LocationID.isHaveCommonArea)
+
+    cache: Optional[LocationCache]
+
+    def __init__(self,
+                 session: Optional[ClientSession] = None,
+                 cache: Optional[LocationCache] = None,
+                 **kwargs):
+        "cache 同 LocationID，其余参数同 _AsyncClient"
+        super().__init__(session, **kwargs)
+        self.cache = cache
+
+    async def loadAll(self, max_in_flight: int = 8) -> LocationTable:
+        "同 LocationID.loadAll，同时进行中的请求不超过 max_in_flight 个"
+        semaphore = asyncio.Semaphore(max(max_in_flight, 1))
+
+        async def getIDs(parent_id: int, url: str) -> Dict[str, int]:
+            async with semaphore:
+                return await self._getIDs(parent_id, url)
+
+        provinces: Dict[str, int] = await getIDs(0, LocationID.provincesUrl())
+        cities_ids: List[Dict[str, int]] = await asyncio.gather(
+            *(getIDs(id_, LocationID.citiesUrl(id_))
+              for id_ in provinces.values()))
+        cities: Dict[Tuple[str, str], int] = {}
+        for province, ids in zip(provinces, cities_ids):
+            for city, id_ in ids.items():
+                cities[province, city] = id_
+        districts_ids: List[Dict[str, int]] = await asyncio.gather(
+            *(getIDs(id_, LocationID.districtsUrl(id_))
+              for id_ in cities.values()))
+        tree: Dict[Tuple[str, str, str], int] = {}
+        for (province, city), ids in zip(cities, districts_ids):
+            for district, id_ in ids.items():
+                tree[province, city, district] = id_
+        if self.cache is not None:
+            self.cache.flush()
+        return LocationTable.fromTree(tree, cities, provinces)
+
+    async def dump(self, path: str, max_in_flight: int = 8) -> LocationTable:
+        "同 LocationID.dump"
+        table: LocationTable = await self.loadAll(max_in_flight)
+        table.dump(path)
+        return table
+
+    async def _getIDs(self, parent_id: int, url: str) -> Dict[str, int]:
+        if self.cache is not None:
+            cached: Optional[Dict[str, int]] = self.cache.getChildren(parent_id)
+            if cached is not None:
+                return cached
+        status, text = await self._get(url)
+        ids: Dict[str, int] = {} if status == 404 else LocationID._parseIDs(
+            text, parent_id or None)
+        if self.cache is not None and status != 404:
+            self.cache.setChildren(parent_id, ids)
+        return ids
+
+    async def getProvincesIDs(self) -> Dict[str, int]:
+        return await self._getIDs(0, LocationID.provincesUrl())
+
+    async def getCitiesIDs(self, province_id: int) -> Dict[str, int]:
+        return await self._getIDs(province_id,
+                                  LocationID.citiesUrl(province_id))
+
+    async def getDistrictsIDs(self, city_id: int) -> Dict[str, int]:
+        return await self._getIDs(city_id, LocationID.districtsUrl(city_id))
+
+    async def getIDFromName(self,
+                            province: str,
+                            city: Optional[str] = None,
+                            district: Optional[str] = None) -> int:
+        if self.cache is not None:
+            cached: Optional[int] = self.cache.getID(province, city, district)
+            if cached is not None:
+                return cached
+        provinces = await self.getProvincesIDs()
+        if province not in provinces:
+            return 0
+        id_tmp = provinces[province]
+        if city is None:
+            return id_tmp
+        cities = await self.getCitiesIDs(id_tmp)
+        if city not in cities:
+            return 0
+        id_tmp = cities[city]
+        if district is None:
+            return id_tmp
+        return (await self.getDistrictsIDs(id_tmp)).get(district, 0)
+
+    async def getNameFromID(self, id_: int) -> List[str]:
+        if self.cache is not None:
+            cached: Optional[List[str]] = self.cache.getName(id_)
+            if cached is not None:
+                return cached
+        id_str = str(id_)
+        if len(id_str) == 5:
+            ids = await self.getProvincesIDs()
+            parent: List[str] = []
+        elif len(id_str) in (7, 9):
+            id2 = int(id_str[:-2])
+            ids, parent = await asyncio.gather(
+                self.getCitiesIDs(id2) if len(id_str) == 7 else
+                self.getDistrictsIDs(id2), self.getNameFromID(id2))
+        else:
+            return []
+        for name, id3 in ids.items():
+            if id3 == id_:
+                return [*parent, name]
+        return []
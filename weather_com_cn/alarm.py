@@ -1,11 +1,72 @@
-from typing import List, Union, Optional, Dict, Tuple, Iterable
-from requests import Session, Response
+from typing import (List, Union, Optional, Dict, Tuple, Iterable, Iterator,
+                    Callable)
+from requests import RequestException, Session, Response
+from threading import Event, get_ident
 from datetime import datetime, timezone, timedelta
-from .model import Alarm, AlarmLevel, AlarmKind, AlarmDetail
+from .model import Alarm, AlarmLevel, AlarmKind, AlarmDetail, AlarmRecord
+from .common import LRUCache, orderedMap
+from .instrument import Instrument, count, span
+from .transport import decodeResponse, getDefaultTransport
 import ast
-from bidict import bidict
 import json
-__all__ = ('AlarmCrawler')
+import os
+import re
+from time import monotonic
+__all__ = ('AlarmCrawler', 'AlarmPoller', 'AlarmDetailCache')
+
+_AnyAlarm = Union[Alarm, AlarmRecord]
+"output 为 'record' 时，构造出的预警为 AlarmRecord"
+
+_json_unsafe_re = re.compile(r'\\(?:/|u[dD][89abAB])')
+"JSON 与 Python 字面量含义不同的转义：\\/ 及 UTF-16 代理对"
+
+
+def _rejectConstant(name: str):
+    raise ValueError(f'unsupported constant: {name}')
+
+
+class AlarmDetailCache():
+    """预警详情的缓存
+
+    同一 short_url 的预警详情发布后不再改变，因此可无限期缓存。
+    内存中至多保留 maxsize 项（LRU）；指定 path 时，
+    还将原始内容以 short_url 为文件名保存于该目录中，内存中淘汰后可从中恢复。
+    """
+    path: Optional[str]
+
+    def __init__(self, maxsize: int = 1024, path: Optional[str] = None):
+        self._memory: LRUCache[AlarmDetail] = LRUCache(maxsize)
+        self.path = path
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def _filePath(self, short_url: str) -> str:
+        assert self.path is not None
+        return os.path.join(self.path, short_url.replace('/', '_'))
+
+    def get(self, short_url: str) -> Optional[AlarmDetail]:
+        "获取缓存的预警详情，未缓存时返回 None"
+        detail: Optional[AlarmDetail] = self._memory.get(short_url)
+        if detail is None and self.path is not None:
+            try:
+                with open(self._filePath(short_url), encoding='utf-8') as f:
+                    text: str = f.read()
+            except OSError:
+                return None
+            detail = AlarmCrawler._parseAlarmDetail(text)
+            self._memory.put(short_url, detail)
+        return detail
+
+    def put(self, short_url: str, text: str, detail: AlarmDetail) -> None:
+        "缓存预警详情，text 为其原始内容"
+        self._memory.put(short_url, detail)
+        if self.path is not None:
+            file_path: str = self._filePath(short_url)
+            # 以进程及线程区分临时文件，并发写入同一项时互不干扰
+            tmp_path: str = f'{file_path}.{os.getpid()}.{get_ident()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, file_path)
 
 
 class AlarmCrawler():
@@ -13,51 +74,148 @@ class AlarmCrawler():
     url: str = 'https://product.weather.com.cn/alarm/grepalarm_cn.php'
     session: Session
     TIMEZONE: timezone = timezone(timedelta(hours=8), "Asia/Shanghai")
+    OUTPUTS: Tuple[str, ...] = ('model', 'construct', 'record')
+    "getAlarms 可选的输出类型，含义同 WeatherCrawler.OUTPUTS"
+    _ALARM_BUILDERS: Dict[str, Callable[..., _AnyAlarm]] = {
+        'model': Alarm,
+        'construct': Alarm.construct,
+        'record': AlarmRecord
+    }
+    output: str
 
-    #cache_IDs: bidict
-    #cache_levels: bidict
+    detail_cache: AlarmDetailCache
+    instrument: Optional[Instrument]
 
-    def __init__(self, session: Optional[Session] = None):
-        self.session: Session = session if session else Session()
-        #self.cache_IDs: bidict = bidict()
-        #self.cache_levels: bidict = bidict()
+    def __init__(self,
+                 session: Optional[Session] = None,
+                 output: str = 'model',
+                 detail_cache: Optional[AlarmDetailCache] = None,
+                 instrument: Optional[Instrument] = None):
+        """session、instrument 同 WeatherCrawler。
+        output 为 getAlarms 的输出类型：'model' 为经过校验的 Alarm；
+        'construct' 为不经校验直接构造的 Alarm；
+        'record' 为轻量的 AlarmRecord，可用其 toModel 方法转换为 Alarm。
+        detail_cache 为预警详情的缓存，为 None 时使用仅在内存中的 AlarmDetailCache
+        """
+        if output not in self.OUTPUTS:
+            raise ValueError(f'unknown output: {output!r}')
+        self.session: Session = session if session else getDefaultTransport()
+        self.output = output
+        self.detail_cache = detail_cache if detail_cache \
+            else AlarmDetailCache()
+        self.instrument = instrument
 
-    def getAlarms(self) -> List[Alarm]:
-        resp: Response = self.session.get(self.url)
-        resp.encoding = resp.apparent_encoding
-        alarms_list: List[List[str]] = self._paramJsVar(resp.text)['data']
-        alarms: List[Alarm] = []
-        for alarm_l in alarms_list:
-            short_url: str = alarm_l[1]
-            url_info: List[str] = short_url[:-5].split('-')
-            time: datetime = datetime(int(url_info[1][:4]),
-                                      int(url_info[1][4:6]),
-                                      int(url_info[1][6:8]),
-                                      int(url_info[1][8:10]),
-                                      int(url_info[1][10:12]),
-                                      int(url_info[1][12:]),
-                                      tzinfo=self.TIMEZONE)
-            alarms.append(
-                Alarm(location=alarm_l[0],
-                      lng_E=float(alarm_l[2]),
-                      lat_N=float(alarm_l[3]),
-                      location_id=int(url_info[0]),
-                      short_url=short_url,
-                      time=time,
-                      kind=AlarmKind(int(url_info[2][:2])),
-                      level=AlarmLevel(int(url_info[2][2:]))))
-        return alarms
+    def getAlarms(self) -> List[_AnyAlarm]:
+        inst: Optional[Instrument] = self.instrument
+        text: str = self._fetchText(self.url)
+        with span(inst, 'parse', crawler='alarm', url=self.url):
+            alarms_list: List[List[str]] = self._paramJsVar(text)['data']
+        count(inst, 'rows_parsed', len(alarms_list), crawler='alarm',
+              url=self.url)
+        build = self._ALARM_BUILDERS[self.output]
+        with span(inst, 'build', crawler='alarm', url=self.url):
+            return [self._buildAlarm(alarm_l, build) for alarm_l in alarms_list]
+
+    def _fetchText(self, url: str) -> str:
+        "下载并解码 url 的内容，分别统计下载及解码"
+        with span(self.instrument, 'fetch', crawler='alarm', url=url):
+            resp: Response = self.session.get(url)
+            content: bytes = resp.content
+        count(self.instrument,
+              'bytes_fetched',
+              len(content),
+              crawler='alarm',
+              url=url)
+        with span(self.instrument, 'decode', crawler='alarm', url=url):
+            return decodeResponse(resp)
+
+    @classmethod
+    def _parseAlarms(cls, text: str, output: str = 'model') -> List[_AnyAlarm]:
+        alarms_list: List[List[str]] = cls._paramJsVar(text)['data']
+        build = cls._ALARM_BUILDERS[output]
+        return [cls._buildAlarm(alarm_l, build) for alarm_l in alarms_list]
+
+    @classmethod
+    def _buildAlarm(cls, alarm_l: List[str],
+                    build: Callable[..., _AnyAlarm]) -> _AnyAlarm:
+        short_url: str = alarm_l[1]
+        url_info: List[str] = short_url[:-5].split('-')
+        time: datetime = datetime(int(url_info[1][:4]),
+                                  int(url_info[1][4:6]),
+                                  int(url_info[1][6:8]),
+                                  int(url_info[1][8:10]),
+                                  int(url_info[1][10:12]),
+                                  int(url_info[1][12:]),
+                                  tzinfo=cls.TIMEZONE)
+        return build(location=alarm_l[0],
+                     lng_E=float(alarm_l[2]),
+                     lat_N=float(alarm_l[3]),
+                     location_id=int(url_info[0]),
+                     short_url=short_url,
+                     time=time,
+                     kind=AlarmKind(int(url_info[2][:2])),
+                     level=AlarmLevel(int(url_info[2][2:])))
 
     def getAlarmDetail(self, short_url: str) -> AlarmDetail:
+        detail: Optional[AlarmDetail] = self.detail_cache.get(short_url)
+        inst: Optional[Instrument] = self.instrument
+        if detail is not None:
+            count(inst, 'cache_hits', 1, crawler='alarm', cache='detail')
+        else:
+            count(inst, 'cache_misses', 1, crawler='alarm', cache='detail')
+            url: str = self.shortUrlToCompleted(short_url)
+            text: str = self._fetchText(url)
+            with span(inst, 'parse', crawler='alarm', url=url):
+                info: Dict[str, str] = self._paramJsVar(text)
+            with span(inst, 'build', crawler='alarm', url=url):
+                detail = self._buildAlarmDetail(info)
+            self.detail_cache.put(short_url, text, detail)
+        return detail
+
+    def getAlarmDetails(self,
+                        short_urls: Iterable[str],
+                        max_workers: int = 8,
+                        max_in_flight: Optional[int] = None
+                        ) -> List[AlarmDetail]:
+        """批量获取预警详情，返回结果的顺序与 short_urls 一致
+
+        已缓存的直接返回，其余以 max_workers 个线程并发获取（参见 orderedMap），
+        重复的 short_url 只获取一次
+        """
+        short_urls = list(short_urls)
+        details: Dict[str, AlarmDetail] = {}
+        missing: List[str] = []
+        for short_url in dict.fromkeys(short_urls):
+            detail: Optional[AlarmDetail] = self.detail_cache.get(short_url)
+            if detail is None:
+                missing.append(short_url)
+            else:
+                details[short_url] = detail
+        count(self.instrument,
+              'cache_hits',
+              len(details),
+              crawler='alarm',
+              cache='detail')
+        details.update(
+            zip(
+                missing,
+                orderedMap(self.getAlarmDetail, missing, max_workers,
+                           max_in_flight)))
+        return [details[short_url] for short_url in short_urls]
+
+    @classmethod
+    def _parseAlarmDetail(cls, text: str) -> AlarmDetail:
+        return cls._buildAlarmDetail(cls._paramJsVar(text))
+
+    @classmethod
+    def _buildAlarmDetail(cls, info: Dict[str, str]) -> AlarmDetail:
+        "由解析出的预警详情原始信息构造 AlarmDetail"
         def timeStrToUTC8(text: str) -> datetime:
             time_tzless: datetime = datetime.fromisoformat(text)
             return datetime.combine(time_tzless.date(),
                                     time_tzless.time(),
-                                    tzinfo=self.TIMEZONE)
+                                    tzinfo=cls.TIMEZONE)
 
-        resp: Response = self.session.get(self.shortUrlToCompleted(short_url))
-        resp.encoding = resp.apparent_encoding
-        info: Dict[str, str] = self._paramJsVar(resp.text)
         return AlarmDetail(title=info['head'],
                            alarm_id=info['ALERTID'],
                            province_name=info['PROVINCE'],
@@ -79,10 +237,143 @@ class AlarmCrawler():
 
     @staticmethod
     def _paramJsVar(data: str) -> Union[list, dict]:
-        '解析 weather.com.cn 上作为数据的 js 变量定义'
+        """解析 weather.com.cn 上作为数据的 js 变量定义
+
+        其值通常为合法的 JSON，此时以 json 解析；不含双引号及转义的单引号写法
+        替换引号后同样以 json 解析；其余情况（含 JSON 与 Python 字面量含义不同的
+        转义等）仍以 ast.literal_eval 解析。对 ast.literal_eval 可解析的内容，
+        结果与其一致
+        """
         info: List[str] = data.strip().split('=', maxsplit=1)
-        return ast.literal_eval(
-            info[1] if info[1][-1] != ';' else info[1][:-1])
+        value: str = info[1] if info[1][-1] != ';' else info[1][:-1]
+        if '"' not in value and '\\' not in value:
+            # 单引号写法且不含双引号及转义时，替换引号后与 JSON 含义相同
+            json_value: str = value.replace("'", '"')
+        elif not _json_unsafe_re.search(value):
+            json_value = value
+        else:
+            return ast.literal_eval(value)
+        try:
+            return json.loads(json_value, parse_constant=_rejectConstant)
+        except ValueError:
+            return ast.literal_eval(value)
 
     def getSession(self) -> Session:
         return self.session
+
+
+class AlarmPoller():
+    """气象预警的增量轮询
+
+    保存上次轮询时的全部预警（以 short_url 为键），每次轮询只返回新增及解除的预警。
+    请求时附带 If-None-Match、If-Modified-Since，服务器返回 304 或内容未变时不解析；
+    内容变化时只构造此前未见过的预警。
+    """
+    crawler: AlarmCrawler
+    interval: float
+    alarms: Dict[str, _AnyAlarm]
+    "当前的全部预警，以 short_url 为键"
+
+    def __init__(self,
+                 crawler: Optional[AlarmCrawler] = None,
+                 interval: float = 60):
+        "crawler 为 None 时新建 AlarmCrawler，interval 为 watch 的轮询间隔（秒）"
+        self.crawler = crawler if crawler else AlarmCrawler()
+        self.interval = interval
+        self.alarms = {}
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        self._content: Optional[bytes] = None
+
+    def poll(self) -> Tuple[List[_AnyAlarm], List[_AnyAlarm]]:
+        """轮询一次，返回（新增的预警，解除的预警）
+
+        首次轮询时，当前的全部预警均视为新增
+        """
+        headers: Dict[str, str] = {}
+        if self._etag is not None:
+            headers['If-None-Match'] = self._etag
+        if self._last_modified is not None:
+            headers['If-Modified-Since'] = self._last_modified
+        inst: Optional[Instrument] = self.crawler.instrument
+        url: str = self.crawler.url
+        with span(inst, 'fetch', crawler='alarm', url=url):
+            resp: Response = self.crawler.getSession().get(url,
+                                                           headers=headers)
+            content: bytes = resp.content
+        if resp.status_code == 304:
+            count(inst, 'cache_hits', 1, crawler='alarm', cache='poll')
+            return [], []
+        resp.raise_for_status()
+        count(inst, 'bytes_fetched', len(content), crawler='alarm', url=url)
+        if content == self._content:
+            count(inst, 'cache_hits', 1, crawler='alarm', cache='poll')
+        else:
+            count(inst, 'cache_misses', 1, crawler='alarm', cache='poll')
+            with span(inst, 'decode', crawler='alarm', url=url):
+                text: str = decodeResponse(resp)
+            with span(inst, 'parse', crawler='alarm', url=url):
+                alarms_list: List[List[str]] = AlarmCrawler._paramJsVar(
+                    text)['data']
+            count(inst, 'rows_parsed', len(alarms_list), crawler='alarm',
+                  url=url)
+            with span(inst, 'build', crawler='alarm', url=url):
+                changes = self._update(alarms_list)
+        # 解析成功后才记录，以免解析失败后因 304 或内容未变而不再重试
+        self._etag = resp.headers.get('ETag')
+        self._last_modified = resp.headers.get('Last-Modified')
+        if content == self._content:
+            return [], []
+        self._content = content
+        return changes
+
+    def _update(self, alarms_list: List[List[str]]
+                ) -> Tuple[List[_AnyAlarm], List[_AnyAlarm]]:
+        build = AlarmCrawler._ALARM_BUILDERS[self.crawler.output]
+        old: Dict[str, _AnyAlarm] = self.alarms
+        alarms: Dict[str, _AnyAlarm] = {}
+        added: List[_AnyAlarm] = []
+        for alarm_l in alarms_list:
+            short_url: str = alarm_l[1]
+            alarm: Optional[_AnyAlarm] = old.get(short_url)
+            if alarm is None:
+                alarm = self.crawler._buildAlarm(alarm_l, build)
+                added.append(alarm)
+            alarms[short_url] = alarm
+        removed: List[_AnyAlarm] = [
+            alarm for short_url, alarm in old.items() if short_url not in alarms
+        ]
+        self.alarms = alarms
+        return added, removed
+
+    def watch(self, stop: Optional[Event] = None
+              ) -> Iterator[Tuple[List[_AnyAlarm], List[_AnyAlarm]]]:
+        """每隔 interval 秒轮询一次，有变化时产出（新增的预警，解除的预警）
+
+        轮询时刻按固定节拍计算，不随每次请求的耗时漂移；错过的节拍直接跳过。
+        某次轮询出现网络错误或无法解码、解析时，以计数 'poll_errors' 报告给
+        crawler 的 instrument（属性 error 为异常的类名），并在下一个节拍重试。
+        stop 被设置后停止。
+        """
+        if stop is None:
+            stop = Event()
+        next_time: float = monotonic()
+        while not stop.is_set():
+            try:
+                added, removed = self.poll()
+            except (RequestException, ValueError, SyntaxError) as e:
+                count(self.crawler.instrument,
+                      'poll_errors',
+                      1,
+                      crawler='alarm',
+                      url=self.crawler.url,
+                      error=type(e).__name__)
+            else:
+                if added or removed:
+                    yield added, removed
+            now: float = monotonic()
+            next_time += self.interval
+            if next_time <= now and self.interval > 0:
+                next_time += (now - next_time) // self.interval * self.interval \
+                    + self.interval
+            stop.wait(next_time - now)
@@ -0,0 +1,292 @@
+"天气预报的列式存储，数值列为 NumPy 数组，字符串列为字典编码"
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+from .model import Weather, WeatherInfoRecord, WeatherRecord
+
+__all__ = ('Categorical', 'WeatherColumns')
+
+_TIMEZONE: timezone = timezone(timedelta(hours=8), "Asia/Shanghai")
+
+
+class Categorical():
+    "字典编码的字符串列，codes 为 -1 表示空值"
+    codes: np.ndarray
+    categories: List[str]
+
+    def __init__(self, codes: np.ndarray, categories: List[str]):
+        self.codes = codes
+        self.categories = categories
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index) -> Union[Optional[str], 'Categorical']:
+        if isinstance(index, (int, np.integer)):
+            code = self.codes[index]
+            return None if code < 0 else self.categories[code]
+        return Categorical(self.codes[index], self.categories)
+
+    def __eq__(self, value) -> np.ndarray:  # type: ignore[override]
+        "与单个字符串逐项比较，返回布尔数组"
+        return self.isin((value, ))
+
+    def isin(self, values: Iterable[str]) -> np.ndarray:
+        "逐项判断是否为 values 之一，返回布尔数组"
+        values = set(values)
+        selected = np.array(
+            [category in values for category in self.categories] + [False],
+            dtype=bool)
+        return selected[self.codes]
+
+    def tolist(self) -> List[Optional[str]]:
+        categories = self.categories
+        return [None if code < 0 else categories[code] for code in self.codes]
+
+
+class _Encoder():
+    "构造 Categorical 用的字典编码器"
+    __slots__ = ('index', 'categories', 'codes')
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.categories: List[str] = []
+        self.codes = array('i')
+
+    def append(self, value: Optional[str]) -> None:
+        if value is None:
+            self.codes.append(-1)
+            return
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.categories)
+            self.categories.append(value)
+        self.codes.append(code)
+
+    def build(self) -> Categorical:
+        return Categorical(np.frombuffer(self.codes, dtype=np.intc).copy(),
+                           self.categories)
+
+
+_CATEGORICALS: Tuple[Tuple[str, int], ...] = (
+    ('province', 0), ('province_url', 1), ('city', 2), ('district', 3),
+    ('day_event', 7), ('day_wind_dir', 8), ('day_wind_scale', 9),
+    ('night_event', 11), ('night_wind_dir', 12), ('night_wind_scale', 13))
+"字符串列及其在解析引擎产出的行中的位置"
+
+
+class WeatherColumnsBuilder():
+    "由解析引擎产出的行逐行填充各列，不构造每行的 Weather"
+
+    def __init__(self):
+        self._encoders: Dict[str, _Encoder] = {
+            name: _Encoder()
+            for name, _ in _CATEGORICALS
+        }
+        self._district_id = array('q')
+        self._date = array('q')
+        self._update_time = array('q')
+        self._temp_max = array('h')
+        self._temp_min = array('h')
+        self._day_valid = array('b')
+        # 日期、更新时间重复较多，缓存其换算结果
+        self._days: Dict[date, int] = {}
+        self._minutes: Dict[datetime, int] = {}
+
+    def extend(self, rows: Iterable[tuple]) -> None:
+        encoders = [(self._encoders[name].append, n)
+                    for name, n in _CATEGORICALS]
+        days = self._days
+        minutes = self._minutes
+        for row in rows:
+            for append, n in encoders:
+                append(row[n])
+            self._district_id.append(row[4])
+            day = days.get(row[5])
+            if day is None:
+                day = days[row[5]] = row[5].toordinal() - _EPOCH_ORDINAL
+            self._date.append(day)
+            minute = minutes.get(row[6])
+            if minute is None:
+                minute = minutes[row[6]] = int(
+                    (row[6].replace(tzinfo=None) - _EPOCH).total_seconds() //
+                    60)
+            self._update_time.append(minute)
+            self._day_valid.append(row[7] is not None)
+            self._temp_max.append(0 if row[10] is None else row[10])
+            self._temp_min.append(row[14])
+
+    def build(self) -> 'WeatherColumns':
+        return WeatherColumns(
+            district_id=np.frombuffer(self._district_id, dtype=np.int64).copy(),
+            date=np.frombuffer(self._date,
+                               dtype=np.int64).astype('datetime64[D]'),
+            update_time=np.frombuffer(self._update_time,
+                                      dtype=np.int64).astype('datetime64[m]'),
+            temp_max=np.frombuffer(self._temp_max, dtype=np.int16).copy(),
+            temp_min=np.frombuffer(self._temp_min, dtype=np.int16).copy(),
+            day_valid=np.frombuffer(self._day_valid, dtype=np.int8).astype(bool),
+            **{name: encoder.build()
+               for name, encoder in self._encoders.items()})
+
+
+_EPOCH: datetime = datetime(1970, 1, 1)
+_EPOCH_ORDINAL: int = _EPOCH.toordinal()
+
+
+class WeatherColumns():
+    """列式存储的天气预报
+
+    district_id、temp_max、temp_min 为整数数组；date 为 datetime64[D] 数组；
+    update_time 为北京时间（不含时区）的 datetime64[m] 数组；
+    其余字符串字段为 Categorical，其中白天天气的各列在无白天天气时为空值。
+    day_valid 为白天天气及最高气温是否有效的布尔数组，
+    无效处 temp_max 的值无意义。
+    """
+    province: Categorical
+    province_url: Categorical
+    city: Categorical
+    district: Categorical
+    district_id: np.ndarray
+    date: np.ndarray
+    update_time: np.ndarray
+    day_event: Categorical
+    day_wind_dir: Categorical
+    day_wind_scale: Categorical
+    night_event: Categorical
+    night_wind_dir: Categorical
+    night_wind_scale: Categorical
+    temp_max: np.ndarray
+    temp_min: np.ndarray
+    day_valid: np.ndarray
+
+    COLUMNS: Tuple[str, ...] = ('province', 'province_url', 'city', 'district',
+                                'district_id', 'date', 'update_time',
+                                'day_event', 'day_wind_dir', 'day_wind_scale',
+                                'night_event', 'night_wind_dir',
+                                'night_wind_scale', 'temp_max', 'temp_min',
+                                'day_valid')
+
+    def __init__(self, **columns):
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name])
+
+    @staticmethod
+    def builder() -> WeatherColumnsBuilder:
+        return WeatherColumnsBuilder()
+
+    @classmethod
+    def fromWeathers(
+            cls, weathers: Iterable[Union[Weather,
+                                          WeatherRecord]]) -> 'WeatherColumns':
+        "由已有的 Weather 或 WeatherRecord 构造"
+        builder = cls.builder()
+        builder.extend(
+            (w.province, w.province_url, w.city, w.district, w.district_id,
+             w.date, w.update_time,
+             *((None, None, None) if w.day_weather is None else
+               (w.day_weather.event, w.day_weather.wind_dir,
+                w.day_weather.wind_scale)), w.temp_max,
+             w.night_weather.event, w.night_weather.wind_dir,
+             w.night_weather.wind_scale, w.temp_min) for w in weathers)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.district_id)
+
+    def __getitem__(self, index) -> 'WeatherColumns':
+        "以布尔数组或下标数组选取若干行"
+        return WeatherColumns(**{
+            name: getattr(self, name)[index]
+            for name in self.COLUMNS
+        })
+
+    def filter(self,
+               provinces: Optional[Iterable[str]] = None,
+               cities: Optional[Iterable[str]] = None,
+               districts: Optional[Iterable[str]] = None,
+               district_id_prefix: Optional[int] = None,
+               dates: Optional[Iterable[date]] = None) -> 'WeatherColumns':
+        "以向量化的方式选取满足全部条件的行"
+        mask = np.ones(len(self), dtype=bool)
+        if provinces is not None:
+            mask &= self.province.isin(provinces)
+        if cities is not None:
+            mask &= self.city.isin(cities)
+        if districts is not None:
+            mask &= self.district.isin(districts)
+        if district_id_prefix is not None:
+            scale = 10**(9 - len(str(district_id_prefix)))
+            mask &= self.district_id // scale == district_id_prefix
+        if dates is not None:
+            mask &= np.isin(self.date,
+                            np.array(list(dates), dtype='datetime64[D]'))
+        return self[mask]
+
+    def groupMin(self, column: str, by: str = 'province') -> Dict[str, int]:
+        "按字符串列 by 分组，求数值列 column 的最小值"
+        return self._groupReduce(column, by, np.minimum)
+
+    def groupMax(self, column: str, by: str = 'province') -> Dict[str, int]:
+        "按字符串列 by 分组，求数值列 column 的最大值"
+        return self._groupReduce(column, by, np.maximum)
+
+    def _groupReduce(self, column: str, by: str, ufunc: np.ufunc) -> dict:
+        groups: Categorical = getattr(self, by)
+        values: np.ndarray = getattr(self, column)
+        codes: np.ndarray = groups.codes
+        if column == 'temp_max':  # 忽略无效的最高气温
+            codes = codes[self.day_valid]
+            values = values[self.day_valid]
+        valid = codes >= 0
+        codes, values = codes[valid], values[valid]
+        if not len(codes):
+            return {}
+        order = np.argsort(codes, kind='stable')
+        codes, values = codes[order], values[order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        reduced = ufunc.reduceat(values, starts)
+        return {
+            groups.categories[code]: value.item()
+            for code, value in zip(codes[starts], reduced)
+        }
+
+    def temperatureRange(self,
+                         by: str = 'province'
+                         ) -> Dict[str, Tuple[int, Optional[int]]]:
+        "按字符串列 by 分组，求最低气温的最小值及最高气温的最大值"
+        mins = self.groupMin('temp_min', by)
+        maxs = self.groupMax('temp_max', by)
+        return {name: (value, maxs.get(name)) for name, value in mins.items()}
+
+    def iterRecords(self) -> Iterator[WeatherRecord]:
+        "逐行转换为 WeatherRecord"
+        columns = [
+            getattr(self, name).tolist() for name in self.COLUMNS
+            if name not in ('date', 'update_time')
+        ]
+        dates = [
+            date.fromordinal(day + _EPOCH_ORDINAL)
+            for day in self.date.astype(np.int64).tolist()
+        ]
+        update_times = [
+            (_EPOCH + timedelta(minutes=minute)).replace(tzinfo=_TIMEZONE)
+            for minute in self.update_time.astype(np.int64).tolist()
+        ]
+        for (province, province_url, city, district, district_id, day_event,
+             day_wind_dir, day_wind_scale, night_event, night_wind_dir,
+             night_wind_scale, temp_max, temp_min, day_valid), date_, \
+                update_time in zip(zip(*columns), dates, update_times):
+            yield WeatherRecord(
+                province, province_url, city, district, district_id, date_,
+                update_time,
+                WeatherInfoRecord(day_event, day_wind_dir, day_wind_scale)
+                if day_valid else None,
+                WeatherInfoRecord(night_event, night_wind_dir,
+                                  night_wind_scale),
+                temp_max if day_valid else None, temp_min)
+
+    def toWeathers(self) -> List[Weather]:
+        "逐行转换为 Weather"
+        return [record.toModel() for record in self.iterRecords()]
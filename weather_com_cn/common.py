@@ -1,46 +1,516 @@
 from requests import Session, Response
-from typing import Optional, List, Dict
+from typing import (Optional, List, Dict, Callable, Iterable, Iterator, TypeVar,
+                    Tuple, Generic, Hashable)
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import deque, OrderedDict
+from threading import RLock
+from weakref import WeakSet
+from bisect import bisect_left
+import atexit
 import json
-__all__ = ("LocationID")
+import os
+import time
+from .instrument import Instrument, count, span
+from .transport import decodeResponse, getDefaultTransport
+__all__ = ("LocationID", "LocationCache", "LocationTable", "LRUCache",
+           "orderedMap")
+
+_T = TypeVar('_T')
+_R = TypeVar('_R')
+
+
+def orderedMap(func: Callable[[_T], _R],
+               iterable: Iterable[_T],
+               max_workers: int,
+               max_in_flight: Optional[int] = None) -> Iterator[_R]:
+    """用线程池并发执行 func，并按输入顺序逐个产出结果
+
+    同时提交的任务数不超过 max_in_flight（默认为 max_workers 的两倍），
+    以免一次性为所有输入创建任务。
+    """
+    if max_in_flight is None:
+        max_in_flight = max_workers * 2
+    max_in_flight = max(max_in_flight, 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending: "deque[Future]" = deque()
+        try:
+            for item in iterable:
+                if len(pending) >= max_in_flight:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(func, item))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class LRUCache(Generic[_R]):
+    """线程安全的 LRU 缓存，超过 maxsize 项时淘汰最久未使用的项
+
+    ttl 不为 None 时，各项在写入 ttl 秒后过期。hits、misses 为 get 的命中及未命中次数
+    """
+    maxsize: int
+    ttl: Optional[float]
+    hits: int
+    misses: int
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = RLock()
+        # 键 -> (值, 过期时间)
+        self._data: "OrderedDict[Hashable, Tuple[_R, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        item = self._data.get(key)
+        return item is not None and item[1] > time.monotonic()
+
+    def get(self, key: Hashable) -> Optional[_R]:
+        "获取缓存的值，不存在或已过期时返回 None"
+        with self._lock:
+            item: Optional[Tuple[_R, float]] = self._data.get(key)
+            if item is not None and item[1] <= time.monotonic():
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(key)
+            return item[0]
+
+    def pop(self, key: Hashable) -> Optional[_R]:
+        "取出并删除缓存的值，不存在或已过期时返回 None，不计入 hits、misses"
+        with self._lock:
+            item: Optional[Tuple[_R, float]] = self._data.pop(key, None)
+        if item is None or item[1] <= time.monotonic():
+            return None
+        return item[0]
+
+    def put(self, key: Hashable, value: _R) -> None:
+        with self._lock:
+            now: float = time.monotonic()
+            self._data[key] = (value, float('inf') if self.ttl is None else
+                               now + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            if self.ttl is not None:
+                # 清理过期的项，以免其在被淘汰前一直占用内存
+                expired: List[Hashable] = [
+                    k for k, (_, expires) in self._data.items()
+                    if expires <= now
+                ]
+                for k in expired:
+                    del self._data[k]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class LocationCache():
+    """省、市、区县编号的本地缓存
+
+    以上级编号为键（省级的上级编号为 0）缓存各级的编号表，并建立编号到
+    （上级编号，名称）的反向索引，名称与编号的互查均无需访问网络。
+    指定 path 时从该文件加载；更新后距上次写入超过 save_interval 秒时写回，
+    其余的更新由 flush 或 save 写回，解释器退出时也会写回未写入的更新。
+    超过 ttl 秒的编号表视为过期，文件格式版本与 VERSION 不同时忽略该文件。
+    """
+    VERSION: int = 1
+    path: Optional[str]
+    ttl: float
+    save_interval: float
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 ttl: float = 30 * 86400,
+                 save_interval: float = 60):
+        self.path = path
+        self.ttl = ttl
+        self.save_interval = save_interval
+        self._lock = RLock()
+        self._children: Dict[int, Dict[str, int]] = {}
+        self._fetched: Dict[int, float] = {}
+        self._parents: Dict[int, Tuple[int, str]] = {}
+        self._dirty: bool = False
+        self._saved: float = time.monotonic()
+        if path is not None:
+            self.load()
+            _file_caches.add(self)
+
+    def _isFresh(self, parent_id: int) -> bool:
+        fetched: Optional[float] = self._fetched.get(parent_id)
+        return fetched is not None and time.time() - fetched < self.ttl
+
+    def getChildren(self, parent_id: int) -> Optional[Dict[str, int]]:
+        "获取下级的编号表，未缓存或已过期时返回 None"
+        with self._lock:
+            if not self._isFresh(parent_id):
+                return None
+            return dict(self._children[parent_id])
+
+    def setChildren(self,
+                    parent_id: int,
+                    ids: Dict[str, int],
+                    fetched: Optional[float] = None) -> None:
+        "缓存下级的编号表，距上次写入超过 save_interval 秒时写回 path"
+        with self._lock:
+            self._setChildren(parent_id, ids,
+                              time.time() if fetched is None else fetched)
+            self._dirty = True
+            if (self.path is not None and
+                    time.monotonic() - self._saved >= self.save_interval):
+                self.save()
+
+    def _setChildren(self, parent_id: int, ids: Dict[str, int],
+                     fetched: float) -> None:
+        for id_ in self._children.get(parent_id, {}).values():
+            self._parents.pop(id_, None)
+        self._children[parent_id] = dict(ids)
+        self._fetched[parent_id] = fetched
+        for name, id_ in ids.items():
+            self._parents[id_] = (parent_id, name)
+
+    def getID(self,
+              province: str,
+              city: Optional[str] = None,
+              district: Optional[str] = None) -> Optional[int]:
+        "由名称获取编号，不存在时返回 0，缓存不足以判断时返回 None"
+        id_: int = 0
+        with self._lock:
+            for name in (province, city, district):
+                if name is None:
+                    break
+                if not self._isFresh(id_):
+                    return None
+                id_ = self._children[id_].get(name, 0)
+                if not id_:
+                    return 0
+        return id_
+
+    def getName(self, id_: int) -> Optional[List[str]]:
+        "由编号获取各级名称，不存在时返回空列表，缓存不足以判断时返回 None"
+        id_str = str(id_)
+        if len(id_str) not in (5, 7, 9):
+            return []
+        with self._lock:
+            parent: Optional[Tuple[int, str]] = self._parents.get(id_)
+            if parent is None or not self._isFresh(parent[0]):
+                return [] if self._isFresh(
+                    0 if len(id_str) == 5 else int(id_str[:-2])) else None
+        if parent[0] == 0:
+            return [parent[1]]
+        names: Optional[List[str]] = self.getName(parent[0])
+        return None if names is None else [*names, parent[1]]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._children.clear()
+            self._fetched.clear()
+            self._parents.clear()
+
+    def load(self) -> None:
+        "从 path 加载缓存，文件不存在、无法解析、版本不符或内容不完整时不加载"
+        assert self.path is not None
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data: dict = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+            return
+        try:
+            lists: List[Tuple[int, Dict[str, int], float]] = [
+                (int(parent_id), dict(entry['ids']), float(entry['fetched']))
+                for parent_id, entry in data['lists'].items()
+            ]
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return
+        with self._lock:
+            for parent_id, ids, fetched in lists:
+                self._setChildren(parent_id, ids, fetched)
+
+    def flush(self) -> None:
+        "有未写入的更新时写回 path"
+        with self._lock:
+            if self._dirty and self.path is not None:
+                self.save()
+
+    def save(self) -> None:
+        "原子地写入 path"
+        assert self.path is not None
+        with self._lock:
+            data = {
+                'version': self.VERSION,
+                'lists': {
+                    str(parent_id): {
+                        'fetched': self._fetched[parent_id],
+                        'ids': ids
+                    }
+                    for parent_id, ids in self._children.items()
+                }
+            }
+            directory: str = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            tmp_path: str = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            self._saved = time.monotonic()
+
+
+_file_caches: 'WeakSet[LocationCache]' = WeakSet()
+"指定了 path 的 LocationCache，解释器退出时写回其未写入的更新"
+
+
+@atexit.register
+def _flushFileCaches() -> None:
+    for cache in list(_file_caches):
+        cache.flush()
+
+
+class LocationTable():
+    """全国区县编号表
+
+    ids 为升序排列的九位区县编号，provinces、cities、districts 为与之对应的
+    省、市、区县名称。各列均为普通列表，可直接序列化，加载时无需访问网络。
+    没有区县的市记为区县名称为空、编号为市级编号加 00 的一行，
+    没有市的省同理，以便按名称查询时与 LocationID 一致。
+    """
+    VERSION: int = 1
+    ids: List[int]
+    provinces: List[str]
+    cities: List[str]
+    districts: List[str]
+
+    def __init__(self, ids: List[int], provinces: List[str], cities: List[str],
+                 districts: List[str]):
+        self.ids = ids
+        self.provinces = provinces
+        self.cities = cities
+        self.districts = districts
+        self._names: Optional[Dict[Tuple[str, ...], int]] = None
+
+    @classmethod
+    def fromTree(
+        cls,
+        tree: Dict[Tuple[str, str, str], int],
+        cities: Dict[Tuple[str, str], int] = {},
+        provinces: Dict[str, int] = {}
+    ) -> 'LocationTable':
+        """由 {(省, 市, 区县): 编号} 构造
+
+        cities 为 {(省, 市): 编号}，provinces 为 {省: 编号}，
+        其中没有区县的市、没有市的省以空的名称记入表中
+        """
+        tree = dict(tree)
+        cities_with_districts = {(p, c) for p, c, _ in tree}
+        provinces_with_cities = {p for p, _ in cities} | {
+            p for p, _, _ in tree
+        }
+        for (province, city), id_ in cities.items():
+            if (province, city) not in cities_with_districts:
+                tree[province, city, ''] = id_ * 100
+        for province, id_ in provinces.items():
+            if province not in provinces_with_cities:
+                tree[province, '', ''] = id_ * 10000
+        rows = sorted((id_, *names) for names, id_ in tree.items())
+        if not rows:
+            return cls([], [], [], [])
+        return cls(*map(list, zip(*rows)))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[Tuple[int, str, str, str]]:
+        "逐个产出（编号，省，市，区县）"
+        return zip(self.ids, self.provinces, self.cities, self.districts)
+
+    def getNameFromID(self, id_: int) -> List[str]:
+        "同 LocationID.getNameFromID，也接受五位的省级、七位的市级编号"
+        id_str = str(id_)
+        if len(id_str) not in (5, 7, 9):
+            return []
+        scale: int = 10**(9 - len(id_str))
+        n: int = bisect_left(self.ids, id_ * scale)
+        if n == len(self.ids) or self.ids[n] // scale != id_:
+            return []
+        names: List[str] = [self.provinces[n], self.cities[n],
+                            self.districts[n]][:(len(id_str) - 3) // 2]
+        return [] if '' in names else names
+
+    def getIDFromName(self,
+                      province: str,
+                      city: Optional[str] = None,
+                      district: Optional[str] = None) -> int:
+        "同 LocationID.getIDFromName，不存在时返回 0"
+        if self._names is None:
+            names: Dict[Tuple[str, ...], int] = {}
+            for id_, *row in self:
+                if row[2]:
+                    names[tuple(row)] = id_
+                if row[1]:
+                    names.setdefault(tuple(row[:2]), id_ // 100)
+                names.setdefault(tuple(row[:1]), id_ // 10000)
+            self._names = names
+        # 与 LocationID 一致，在第一个为 None 的名称处截止
+        key: Tuple[str, ...] = (province, )
+        for name in (city, district):
+            if name is None:
+                break
+            key += (name, )
+        return self._names.get(key, 0)
+
+    def dump(self, path: str) -> None:
+        "以 JSON 格式写入 path"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(
+                {
+                    'version': self.VERSION,
+                    'ids': self.ids,
+                    'provinces': self.provinces,
+                    'cities': self.cities,
+                    'districts': self.districts
+                },
+                f,
+                ensure_ascii=False,
+                separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path: str) -> 'LocationTable':
+        "读取由 dump 写入的文件，版本不符时抛出 ValueError"
+        with open(path, encoding='utf-8') as f:
+            data: dict = json.load(f)
+        if data.get('version') != cls.VERSION:
+            raise ValueError(f'unknown version: {data.get("version")!r}')
+        return cls(data['ids'], data['provinces'], data['cities'],
+                   data['districts'])
 
 
 class LocationID():
-    def __init__(self, session: Optional[Session] = None):
-        self.session = session if session else Session()
+    cache: Optional[LocationCache]
+    instrument: Optional[Instrument]
+
+    def __init__(self,
+                 session: Optional[Session] = None,
+                 cache: Optional[LocationCache] = None,
+                 instrument: Optional[Instrument] = None):
+        """session、instrument 同 WeatherCrawler。
+        传入 cache 时，各编号表优先从缓存中获取，并将新获取的编号表存入缓存
+        """
+        self.session = session if session else getDefaultTransport()
+        self.cache = cache
+        self.instrument = instrument
 
     def getProvincesIDs(self) -> Dict[str, int]:
-        resp: Response = self.session.get(
-            'http://www.weather.com.cn/data/city3jdata/china.html')
-        if resp.status_code == 404:
-            return {}
-        resp.encoding = resp.apparent_encoding
-        ids_dict: dict = json.loads(resp.text)
-        return {ids_dict[i]: int(i) for i in ids_dict}
+        return self._getIDs(0, self.provincesUrl())
 
     def getCitiesIDs(self, province_id: int) -> Dict[str, int]:
-        resp: Response = self.session.get(
-            f'http://www.weather.com.cn/data/city3jdata/provshi/{province_id}.html'
-        )
-        if resp.status_code == 404:
-            return {}
-        resp.encoding = resp.apparent_encoding
-        ids_dict: dict = json.loads(resp.text)
-        return {ids_dict[i]: int(str(province_id) + i) for i in ids_dict}
+        return self._getIDs(province_id, self.citiesUrl(province_id))
 
     def getDistrictsIDs(self, city_id: int) -> Dict[str, int]:
-        resp: Response = self.session.get(
-            f'http://www.weather.com.cn/data/city3jdata/station/{city_id}.html'
-        )
+        return self._getIDs(city_id, self.districtsUrl(city_id))
+
+    def loadAll(self,
+                max_workers: int = 8,
+                max_in_flight: Optional[int] = None) -> LocationTable:
+        """获取全国所有区县的编号
+
+        以 max_workers 个线程并发获取各省、市的下级编号表，同时提交的请求不超过
+        max_in_flight 个（同 orderedMap）。有 cache 时各编号表同样先查缓存，
+        获取完毕后一次性写回缓存文件。
+        """
+        provinces: Dict[str, int] = self.getProvincesIDs()
+        cities: Dict[Tuple[str, str], int] = {}
+        for province, ids in zip(
+                provinces,
+                orderedMap(self.getCitiesIDs, provinces.values(), max_workers,
+                           max_in_flight)):
+            for city, id_ in ids.items():
+                cities[province, city] = id_
+        tree: Dict[Tuple[str, str, str], int] = {}
+        for (province, city), ids in zip(
+                cities,
+                orderedMap(self.getDistrictsIDs, cities.values(), max_workers,
+                           max_in_flight)):
+            for district, id_ in ids.items():
+                tree[province, city, district] = id_
+        if self.cache is not None:
+            self.cache.flush()
+        return LocationTable.fromTree(tree, cities, provinces)
+
+    def dump(self,
+             path: str,
+             max_workers: int = 8,
+             max_in_flight: Optional[int] = None) -> LocationTable:
+        "获取全国所有区县的编号并写入 path，参见 loadAll 及 LocationTable.dump"
+        table: LocationTable = self.loadAll(max_workers, max_in_flight)
+        table.dump(path)
+        return table
+
+    def _getIDs(self, parent_id: int, url: str) -> Dict[str, int]:
+        "获取下级的编号表，parent_id 为 0 时为省级编号表"
+        inst: Optional[Instrument] = self.instrument
+        if self.cache is not None:
+            cached: Optional[Dict[str, int]] = self.cache.getChildren(parent_id)
+            if cached is not None:
+                count(inst, 'cache_hits', 1, crawler='location',
+                      cache='location')
+                return cached
+            count(inst, 'cache_misses', 1, crawler='location', cache='location')
+        with span(inst, 'fetch', crawler='location', url=url):
+            resp: Response = self.session.get(url)
+            content: bytes = resp.content
+        count(inst, 'bytes_fetched', len(content), crawler='location', url=url)
         if resp.status_code == 404:
-            return {}
-        resp.encoding = resp.apparent_encoding
-        ids_dict: dict = json.loads(resp.text)
-        return {ids_dict[i]: int(str(city_id) + i) for i in ids_dict}
+            ids: Dict[str, int] = {}
+        else:
+            with span(inst, 'decode', crawler='location', url=url):
+                text: str = decodeResponse(resp)
+            with span(inst, 'parse', crawler='location', url=url):
+                ids = self._parseIDs(text, parent_id or None)
+            count(inst, 'rows_parsed', len(ids), crawler='location', url=url)
+        # 404 不缓存，以免在 ttl 内一直被当作空的编号表
+        if self.cache is not None and resp.status_code != 404:
+            self.cache.setChildren(parent_id, ids)
+        return ids
+
+    @staticmethod
+    def provincesUrl() -> str:
+        return 'http://www.weather.com.cn/data/city3jdata/china.html'
+
+    @staticmethod
+    def citiesUrl(province_id: int) -> str:
+        return f'http://www.weather.com.cn/data/city3jdata/provshi/{province_id}.html'
+
+    @staticmethod
+    def districtsUrl(city_id: int) -> str:
+        return f'http://www.weather.com.cn/data/city3jdata/station/{city_id}.html'
+
+    @staticmethod
+    def _parseIDs(text: str, parent_id: Optional[int] = None) -> Dict[str, int]:
+        "解析 city3jdata 中的编号表，子级编号为上级编号后接表中的编号"
+        ids_dict: dict = json.loads(text)
+        prefix: str = '' if parent_id is None else str(parent_id)
+        return {ids_dict[i]: int(prefix + i) for i in ids_dict}
 
     def getIDFromName(self,
                       province: str,
                       city: Optional[str] = None,
                       district: Optional[str] = None) -> int:
+        if self.cache is not None:
+            cached: Optional[int] = self.cache.getID(province, city, district)
+            if cached is not None:
+                return cached
         provinces = self.getProvincesIDs()
         if province in provinces:
             id_tmp = provinces[province]
@@ -64,6 +534,10 @@ class LocationID():
             return 0
 
     def getNameFromID(self, id_: int) -> List[str]:
+        if self.cache is not None:
+            cached: Optional[List[str]] = self.cache.getName(id_)
+            if cached is not None:
+                return cached
         id_str = str(id_)
         if len(id_str) == 9:
             id2 = int(id_str[:-2])
@@ -0,0 +1,117 @@
+from datetime import date
+from typing import Dict, FrozenSet, Iterable, Iterator, Optional, Tuple, Union
+from .model import Weather
+__all__ = ('WeatherFilter',)
+
+
+class _Node():
+    "过滤器前缀树的节点"
+    __slots__ = ('accept_all', 'is_leaf', 'is_empty', 'children')
+    accept_all: bool
+    "对应 None，其下的地区全部匹配"
+    is_leaf: bool
+    "对应集合，其元素为最后一级"
+    is_empty: bool
+    children: Dict[str, '_Node']
+
+    def __init__(self, spec):
+        self.accept_all = spec is None
+        self.is_leaf = not isinstance(spec, dict)
+        self.children = {}
+        if isinstance(spec, dict):
+            self.children = {k: _Node(v) for k, v in spec.items()}
+        elif spec is not None and not isinstance(spec, (str, bool)):
+            self.children = {k: _LEAF for k in spec}
+        self.is_empty = not self.children
+
+
+_LEAF = _Node(())
+
+
+class WeatherFilter():
+    """编译后的天气预报过滤器
+
+    districts_included、districts_excluded 为嵌套的字典/集合，依次以省、市、县/区
+    为键，None 表示其下的地区全部匹配；dates_included、dates_excluded 为日期的集合。
+    构造时将其编译为前缀树及哈希集合，每级只需一次哈希查找，
+    并缓存各地区的过滤结果，可重复用于多个页面及 WeatherCrawler.filterWeathers。
+    """
+    dates_included: Optional[FrozenSet[date]]
+    dates_excluded: FrozenSet[date]
+
+    def __init__(self,
+                 districts_included: Optional[Union[dict, list]] = None,
+                 districts_excluded: Union[dict, list] = {},
+                 dates_included: Optional[Iterable[date]] = None,
+                 dates_excluded: Iterable[date] = {}):
+        self._included: _Node = _Node(districts_included)
+        self._excluded: _Node = _Node(districts_excluded)
+        self.dates_included = None if dates_included is None else frozenset(
+            dates_included)
+        self.dates_excluded = frozenset(dates_excluded)
+        self._cache: Dict[Tuple[str, str, str], int] = {}
+
+    def isDateUnmatch(self, date_: date) -> bool:
+        "判断某日期是否被过滤器过滤"
+        return (self.dates_included is not None and date_
+                not in self.dates_included) or date_ in self.dates_excluded
+
+    def isDistrictUnmatch(self, province: str, city: str,
+                          district: str) -> int:
+        """判断某区域是否被过滤器过滤
+
+        返回被过滤的行政单位级别：0 未被过滤，1 省级，2 市级，3 区县级。
+        只关心省级（市级）是否被过滤时，可将市、县/区（县/区）传入空字符串
+        """
+        key = (province, city, district)
+        unmatch: Optional[int] = self._cache.get(key)
+        if unmatch is None:
+            unmatch = self._cache[key] = self._unmatch(key)
+        return unmatch
+
+    def _unmatch(self, district: Tuple[str, str, str]) -> int:
+        # 被“包含”过滤器过滤的级别，4 表示未被过滤
+        m: int = 3
+        node: _Node = self._included
+        for n, name in enumerate(district):
+            if node.accept_all:
+                m = 4
+                break
+            child: Optional[_Node] = node.children.get(name)
+            if child is None:
+                m = n if node.is_empty else n + 1
+                break
+            if node.is_leaf:
+                m = 4
+                break
+            node = child
+
+        node = self._excluded
+        for n, name in enumerate(district):
+            if node.accept_all:
+                return min(max(n, 1), m)
+            child = node.children.get(name)
+            if child is None:
+                return 0 if m == 4 else m
+            if node.is_leaf:
+                return min(n + 1, m)
+            node = child
+        return min(3, m)
+
+    def isUnmatch(self, weather: Weather) -> bool:
+        "判断某天气预报是否被过滤"
+        return self.isDateUnmatch(weather.date) or bool(
+            self.isDistrictUnmatch(weather.province, weather.city,
+                                   weather.district))
+
+    def filter(self, weathers: Iterable[Weather]) -> Iterator[Weather]:
+        "逐个产出未被过滤的天气预报"
+        dates_included = self.dates_included
+        dates_excluded = self.dates_excluded
+        is_district_unmatch = self.isDistrictUnmatch
+        for w in weathers:
+            if (dates_included is not None and w.date not in dates_included
+                ) or w.date in dates_excluded:
+                continue
+            if not is_district_unmatch(w.province, w.city, w.district):
+                yield w
@@ -1,27 +1,188 @@
 import ast
-from .model import Weather, WeatherInfo, provincial_cities, provinces
+from .model import (Weather, WeatherInfo, WeatherInfoRecord, WeatherRecord,
+                    provincial_cities, provinces)
 from datetime import datetime, timezone, timedelta, date
 from requests import Session, Response
-from typing import Union, Optional, Dict, List, Iterable, Union
+from typing import (Union, Optional, Dict, List, Iterable, Iterator, Tuple,
+                    Union, Callable, TypeVar, TYPE_CHECKING)
+from concurrent.futures import Executor
+from functools import partial
+import re
 from bs4 import BeautifulSoup, element
+from lxml import etree, html as lxml_html
+from .common import LRUCache, orderedMap
+from .filters import WeatherFilter
+from .instrument import Instrument, count, span
+from .transport import decodeContent, decodeResponse, getDefaultTransport
+if TYPE_CHECKING:
+    from .columnar import WeatherColumns
 
 __all__ = ('WeatherCrawler')
 
+_T = TypeVar('_T')
+
+
+def _parseList(parse: Callable[[str], Iterable[_T]], text: str) -> List[_T]:
+    "在 parse_executor 中执行的解析，返回列表以便传回"
+    return list(parse(text))
+
+
+def _xpathClass(tag: str, class_: str) -> etree.XPath:
+    "选取 class 中含有 class_ 的后代 tag 元素，与 bs4 的 class 匹配规则一致"
+    return etree.XPath(f"descendant::{tag}[contains(concat(' ', "
+                       f"normalize-space(@class), ' '), ' {class_} ')]")
+
+
+_xpath_content = _xpathClass('div', 'contentboxTab')
+_xpath_hanml = _xpathClass('div', 'hanml')
+_xpath_tabs = _xpathClass('div', 'conMidtab')
+_xpath_day_tabs = _xpathClass('ul', 'day_tabs')
+_xpath_previous_a = etree.XPath('preceding::a[1]')
+_xpath_text = etree.XPath('string()', smart_strings=False)
+
+
+def _spanTexts(td: etree._Element) -> List[str]:
+    return [_xpath_text(span) for span in td.iter('span')]
+
+
+_tab_start_re = re.compile(
+    r'<div\b[^>]*\bclass\s*=\s*["\']conMidtab["\'][^>]*>', re.IGNORECASE)
+
+
+def _splitTabs(text: str) -> Tuple[str, List[str]]:
+    """按日期标签页（conMidtab）切分页面源码
+
+    返回第一个标签页之前的部分及各标签页的源码，以便只解析需要的标签页；
+    无法切分（没有标签页，或日期列表不在标签页之前）时，返回整个页面及空列表
+    """
+    starts: List[int] = [m.start() for m in _tab_start_re.finditer(text)]
+    if not starts or 'day_tabs' not in text[:starts[0]]:
+        return text, []
+    return text[:starts[0]], [
+        text[start:end] for start, end in zip(starts, starts[1:] + [None])
+    ]
+
+
+_tr_re = re.compile(r'<tr\b', re.IGNORECASE)
+_district_url_re = re.compile(r'/\d{9}\.shtml')
+
+
+def _countRows(text: str) -> int:
+    "页面中天气预报的行数（含县/区链接的 tr），含被过滤的标签页，不解析页面"
+    return sum(1 for tr_text in _tr_re.split(text)[1:]
+               if _district_url_re.search(tr_text))
+
+
+_update_time_re = re.compile(
+    re.escape('更新时间'.encode()) +
+    rb'\D{0,64}?(\d{4}-\d{1,2}-\d{1,2} \d{1,2}:\d{2})')
+"页面头部的更新时间（UTF-8 编码）"
+
+
+class _PageState():
+    "refreshWeathers 记录的页面状态"
+    __slots__ = ('etag', 'last_modified', 'update_stamp', 'weathers')
+
+    def __init__(self, etag: Optional[str], last_modified: Optional[str],
+                 update_stamp: Optional[bytes], weathers: List[Weather]):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.update_stamp = update_stamp
+        "页面头部的更新时间，未找到时为 None"
+        self.weathers = weathers
+        "页面中全部的天气预报（未经过滤）"
+
 
 class WeatherCrawler():
     "国内天气预报爬虫"
     base_url: str = "http://www.weather.com.cn"
     url: str = "http://www.weather.com.cn/textFC/hb.shtml"
     TIMEZONE: timezone = timezone(timedelta(hours=8), "Asia/Shanghai")
+    ENGINES: Dict[str, str] = {'bs4': '_iterRowsBs4', 'lxml': '_iterRowsLxml'}
+    "解析引擎名及对应的方法名"
+    OUTPUTS: Dict[str, str] = {
+        'model': '_buildWeather',
+        'construct': '_constructWeather',
+        'record': '_buildWeatherRecord'
+    }
+    "输出类型及对应的构造方法名"
     session: Session
+    engine: str
+    output: str
+    page_cache: LRUCache[str]
+    "页面缓存，以完整的 url 为键，其 hits、misses 为命中及未命中次数"
+    instrument: Optional[Instrument]
+
+    def __init__(self,
+                 session: Optional[Session] = None,
+                 engine: str = 'bs4',
+                 output: str = 'model',
+                 page_ttl: float = 0,
+                 page_cache_size: int = 64,
+                 instrument: Optional[Instrument] = None,
+                 lists_ttl: float = 60):
+        """session 为 None 时使用各爬虫共用的 transport.getDefaultTransport()
+
+        engine 为解析天气预报页面所用的引擎，可选 'bs4' 或 'lxml'
+
+        两者结果相同，'lxml' 不构造 BeautifulSoup 树，速度更快。
+
+        output 为天气预报的输出类型：'model' 为经过校验的 Weather；
+        'construct' 为不经校验直接构造的 Weather；
+        'record' 为轻量的 WeatherRecord，可用其 toModel 方法转换为 Weather
 
-    def __init__(self, session: Optional[Session] = None):
-        self.session: Session = session if session else Session()
+        下载的页面在 page_ttl 秒内缓存于 page_cache 中（至多 page_cache_size 个），
+        各列表及天气预报共用，page_ttl 为 0（默认）时不缓存。
+
+        省份列表及区域列表在 lists_ttl 秒内缓存，为 0 时不缓存；
+        为获取列表而下载的 url 页面（其本身也是区域页面），
+        在 lists_ttl 秒内可供随后的一次天气预报获取复用，复用后即丢弃，
+        故全国的天气预报获取不会重复下载该页面
+
+        instrument 为各阶段的耗时及计数的接收者（参见 instrument 模块），
+        为 None 时不统计
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f'unknown engine: {engine!r}')
+        if output not in self.OUTPUTS:
+            raise ValueError(f'unknown output: {output!r}')
+        self.session: Session = session if session else getDefaultTransport()
+        self.engine = engine
+        self.output = output
+        self.page_cache = LRUCache(page_cache_size, page_ttl)
+        self._lists_cache: LRUCache[Tuple[Dict[str, str], Dict[
+            str, str]]] = LRUCache(8, lists_ttl)
+        self._list_page: LRUCache[str] = LRUCache(1, lists_ttl)
+        self._page_states: Dict[str, _PageState] = {}
+        self.instrument = instrument
 
     def getProvincesList(self) -> Dict[str, str]:
-        resp: Response = self.session.get(self.url)
-        resp.encoding = resp.apparent_encoding
-        bs: BeautifulSoup = BeautifulSoup(resp.text, 'lxml')
+        return dict(self._getLists()[0])
+
+    def getAreasList(self) -> Dict[str, str]:
+        return dict(self._getLists()[1])
+
+    def _getLists(self) -> Tuple[Dict[str, str], Dict[str, str]]:
+        "获取并解析 url 页面中的省份列表及区域列表，两者共用一次下载及解析"
+        lists = self._lists_cache.get(self.url)
+        if lists is None:
+            text: str = self._fetchPage(self.url)
+            lists = self._parseLists(text)
+            if self._lists_cache.ttl:
+                self._lists_cache.put(self.url, lists)
+                self._list_page.put(self.url, text)
+        return lists
+
+    @classmethod
+    def _parseLists(cls, text: str
+                    ) -> Tuple[Dict[str, str], Dict[str, str]]:
+        bs: BeautifulSoup = BeautifulSoup(text, 'lxml')
+        return cls._parseProvincesList(bs), cls._parseAreasList(bs)
+
+    @staticmethod
+    def _parseProvincesList(text: Union[str, BeautifulSoup]) -> Dict[str, str]:
+        bs: BeautifulSoup = BeautifulSoup(text, 'lxml') if isinstance(
+            text, str) else text
         div = bs.find('div', attrs={'class': 'lqcontentBoxheader'})
         assert isinstance(div, element.Tag)
         return {
@@ -29,97 +190,480 @@ class WeatherCrawler():
             for city_bs in div.find_all('a', target='_blank')
         }
 
-    def getAreasList(self) -> Dict[str, str]:
-        resp: Response = self.session.get(self.url)
-        resp.encoding = resp.apparent_encoding
-        bs: BeautifulSoup = BeautifulSoup(resp.text, 'lxml')
+    @staticmethod
+    def _parseAreasList(text: Union[str, BeautifulSoup]) -> Dict[str, str]:
+        bs: BeautifulSoup = BeautifulSoup(text, 'lxml') if isinstance(
+            text, str) else text
         ul = bs.find('ul', attrs={'class': 'lq_contentboxTab2'})
         assert isinstance(ul, element.Tag)
         return {city_bs.text: city_bs['href'] for city_bs in ul.find_all('a')}
 
     @staticmethod
-    def _isDistrictUnmatch(district: List[str], districts_included,
-                           districts_excluded) -> int:
-        """判断某区域是否被过滤器过滤
+    def _compileFilter(districts_included: Optional[Union[dict, list]],
+                       districts_excluded: Union[dict, list],
+                       dates_included: Optional[Iterable[date]],
+                       dates_excluded: Iterable[date],
+                       weather_filter: Optional[WeatherFilter]
+                       ) -> WeatherFilter:
+        "传入了编译好的 weather_filter 时直接使用，否则由各过滤条件编译"
+        if weather_filter is not None:
+            return weather_filter
+        return WeatherFilter(districts_included, districts_excluded,
+                             dates_included, dates_excluded)
+
+    @classmethod
+    def filterWeathers(
+            cls,
+            weathers: Iterable[Weather],
+            districts_included: Optional[Union[dict, list]] = None,
+            districts_excluded: Union[dict, list] = {},
+            dates_included: Optional[Iterable[date]] = None,
+            dates_excluded: Iterable[date] = {},
+            weather_filter: Optional[WeatherFilter] = None) -> List[Weather]:
+        return list(
+            cls._compileFilter(districts_included, districts_excluded,
+                               dates_included, dates_excluded,
+                               weather_filter).filter(weathers))
+
+    def getNationWideWeathers(
+            self,
+            districts_included: Optional[Union[dict, list]] = None,
+            districts_excluded: Union[dict, list] = {},
+            dates_included: Optional[Iterable[date]] = None,
+            dates_excluded: Iterable[date] = {},
+            weather_filter: Optional[WeatherFilter] = None,
+            max_workers: int = 1,
+            max_in_flight: Optional[int] = None,
+            parse_executor: Optional[Executor] = None) -> List[Weather]:
+        return self.getWeathers(self.getAreasList().values(),
+                                districts_included, districts_excluded,
+                                dates_included, dates_excluded, weather_filter,
+                                max_workers, max_in_flight, parse_executor)
+
+    def iterNationWideWeathers(
+        self,
+        districts_included: Optional[Union[dict, list]] = None,
+        districts_excluded: Union[dict, list] = {},
+        dates_included: Optional[Iterable[date]] = None,
+        dates_excluded: Iterable[date] = {},
+        weather_filter: Optional[WeatherFilter] = None,
+        max_workers: int = 1,
+        max_in_flight: Optional[int] = None,
+        parse_executor: Optional[Executor] = None,
+        batches: bool = False
+    ) -> Iterator[Union[Weather, List[Weather]]]:
+        return self.iterWeathers(self.getAreasList().values(),
+                                 districts_included, districts_excluded,
+                                 dates_included, dates_excluded,
+                                 weather_filter, max_workers, max_in_flight,
+                                 parse_executor, batches)
+
+    def getWeathers(
+            self,
+            url: Union[str, Iterable[str]],
+            districts_included: Optional[Union[dict, list]] = None,
+            districts_excluded: Union[dict, list] = {},
+            dates_included: Optional[Iterable[date]] = None,
+            dates_excluded: Iterable[date] = {},
+            weather_filter: Optional[WeatherFilter] = None,
+            max_workers: int = 1,
+            max_in_flight: Optional[int] = None,
+            parse_executor: Optional[Executor] = None) -> List[Weather]:
+        """获取天气预报
+
+        url 为多个页面时，max_workers > 1 则以线程池并发下载及解析各页面，
+        同时进行中的页面不超过 max_in_flight 个；传入 parse_executor
+        （如 ProcessPoolExecutor）可将解析交给其执行，以利用多核。
+        无论是否并发，返回结果的顺序都与 url 的顺序一致。
+
+        各过滤条件见 WeatherFilter，也可直接传入编译好的 weather_filter。
+        """
+        return list(
+            self.iterWeathers(url, districts_included, districts_excluded,
+                              dates_included, dates_excluded, weather_filter,
+                              max_workers, max_in_flight, parse_executor))
+
+    def iterWeathers(
+        self,
+        url: Union[str, Iterable[str]],
+        districts_included: Optional[Union[dict, list]] = None,
+        districts_excluded: Union[dict, list] = {},
+        dates_included: Optional[Iterable[date]] = None,
+        dates_excluded: Iterable[date] = {},
+        weather_filter: Optional[WeatherFilter] = None,
+        max_workers: int = 1,
+        max_in_flight: Optional[int] = None,
+        parse_executor: Optional[Executor] = None,
+        batches: bool = False
+    ) -> Iterator[Union[Weather, List[Weather]]]:
+        """逐个产出天气预报，参数同 getWeathers
+
+        顺序获取时，每解析出一行即产出，同时只保留一个页面；
+        并发获取或使用 parse_executor 时，以页面为单位产出，
+        同时保留的页面不超过 max_in_flight 个。
+        batches 为 True 时，以页面为单位产出 Weather 的列表。
 
-        返回被过滤的行政单位级别：1 省级，2 市级，3 区县级
+        注意：page_ttl 不为 0 时，下载的页面源码还会保留于 page_cache 中
+        （至多 page_cache_size 个，保留 page_ttl 秒），内存峰值随之增加；
+        需要将内存峰值控制在约一个页面时，应以 page_ttl=0 构造 WeatherCrawler。
         """
-        m: int = len(district) + 1
-        for n, i in enumerate(district):
-            if districts_included is None:
-                break
-            if i in districts_included:
-                if isinstance(districts_included, set):
-                    break
-                districts_included = districts_included[i]
+        flt: WeatherFilter = self._compileFilter(districts_included,
+                                                 districts_excluded,
+                                                 dates_included,
+                                                 dates_excluded, weather_filter)
+        urls: Iterable[str] = [url] if isinstance(url, str) else url
+        if self.instrument is not None:
+            # 分别统计解析及构造的耗时，此时以页面为单位产出
+            yield from self._iterInstrumentedWeathers(urls, flt, max_workers,
+                                                      max_in_flight,
+                                                      parse_executor, batches)
+            return
+        parse: Callable[[str], Iterable[Weather]] = partial(
+            self._iterPageWeathers,
+            weather_filter=flt,
+            engine=self.engine,
+            output=self.output)
+        for page in self._iterPages(urls, parse, max_workers, max_in_flight,
+                                    parse_executor):
+            if batches:
+                yield page if isinstance(page, list) else list(page)
             else:
-                m = n + 1 if districts_included else max(n, 0)
-                break
-        else:
-            m = n + 1
-
-        for n, i in enumerate(district):
-            if districts_excluded is None:
-                return min(max(n, 1), m)
-            if i in districts_excluded:
-                if isinstance(districts_excluded, set):
-                    return min(n + 1, m)
-                districts_excluded = districts_excluded[i]
+                yield from page
+
+    def _iterInstrumentedWeathers(
+        self, urls: Iterable[str], flt: WeatherFilter, max_workers: int,
+        max_in_flight: Optional[int], parse_executor: Optional[Executor],
+        batches: bool) -> Iterator[Union[Weather, List[Weather]]]:
+        "同 iterWeathers，但先解析出各行，再构造 Weather，分别统计二者的耗时"
+        parse: Callable[[str], Iterable[tuple]] = partial(
+            self._iterPageRows, weather_filter=flt, engine=self.engine)
+        build = getattr(self, self.OUTPUTS[self.output])
+        for rows in self._iterPages(urls, parse, max_workers, max_in_flight,
+                                    parse_executor):
+            with span(self.instrument, 'build', crawler='forecast'):
+                page: List[Weather] = [build(row) for row in rows]
+            if batches:
+                yield page
             else:
-                if m == len(district) + 1:
-                    return 0
-                else:
-                    return m
-        return min(n + 1, m)
+                yield from page
 
-    @classmethod
-    def filterWeathers(cls,
-                       weathers: Iterable[Weather],
-                       districts_included: Optional[Union[dict, list]] = None,
-                       districts_excluded: Union[dict, list] = {},
-                       dates_included: Optional[Iterable[date]] = None,
-                       dates_excluded: Iterable[date] = {}) -> List[Weather]:
-        return [
-            w for w in weathers if
-            not cls._isDateUnmatch(w.date, dates_included, dates_excluded) and
-            not cls._isDistrictUnmatch([w.province, w.city, w.district],
-                                       districts_included, districts_excluded)
-        ]
+    def getNationWideWeatherColumns(
+            self,
+            districts_included: Optional[Union[dict, list]] = None,
+            districts_excluded: Union[dict, list] = {},
+            dates_included: Optional[Iterable[date]] = None,
+            dates_excluded: Iterable[date] = {},
+            weather_filter: Optional[WeatherFilter] = None,
+            max_workers: int = 1,
+            max_in_flight: Optional[int] = None,
+            parse_executor: Optional[Executor] = None) -> 'WeatherColumns':
+        return self.getWeatherColumns(self.getAreasList().values(),
+                                      districts_included, districts_excluded,
+                                      dates_included, dates_excluded,
+                                      weather_filter, max_workers,
+                                      max_in_flight, parse_executor)
 
-    @staticmethod
-    def _isDateUnmatch(date_: date,
-                       dates_included: Optional[Iterable[date]] = None,
-                       dates_excluded: Iterable[date] = {}) -> bool:
-        "判断某日期是否被过滤器过滤"
-        return (dates_included is not None
-                and date_ not in dates_included) or date_ in dates_excluded
+    def getWeatherColumns(
+            self,
+            url: Union[str, Iterable[str]],
+            districts_included: Optional[Union[dict, list]] = None,
+            districts_excluded: Union[dict, list] = {},
+            dates_included: Optional[Iterable[date]] = None,
+            dates_excluded: Iterable[date] = {},
+            weather_filter: Optional[WeatherFilter] = None,
+            max_workers: int = 1,
+            max_in_flight: Optional[int] = None,
+            parse_executor: Optional[Executor] = None) -> 'WeatherColumns':
+        """获取列式存储的天气预报（需要 NumPy），参数同 getWeathers
 
-    def getNationWideWeathers(
+        解析出的各行直接填入各列，不构造每行的 Weather
+        """
+        from .columnar import WeatherColumns
+
+        flt: WeatherFilter = self._compileFilter(districts_included,
+                                                 districts_excluded,
+                                                 dates_included,
+                                                 dates_excluded, weather_filter)
+        urls: Iterable[str] = [url] if isinstance(url, str) else url
+        parse: Callable[[str], Iterable[tuple]] = partial(
+            self._iterPageRows, weather_filter=flt, engine=self.engine)
+        builder = WeatherColumns.builder()
+        for rows in self._iterPages(urls, parse, max_workers, max_in_flight,
+                                    parse_executor):
+            with span(self.instrument, 'build', crawler='forecast'):
+                builder.extend(rows)
+        return builder.build()
+
+    def refreshNationWideWeathers(
             self,
             districts_included: Optional[Union[dict, list]] = None,
             districts_excluded: Union[dict, list] = {},
             dates_included: Optional[Iterable[date]] = None,
-            dates_excluded: Iterable[date] = {}) -> List[Weather]:
-        return self.getWeathers(self.getAreasList().values(),
-                                districts_included, districts_excluded,
-                                dates_included, dates_excluded)
-
-    def getWeathers(self,
-                    url: Union[str, Iterable[str]],
-                    districts_included: Optional[Union[dict, list]] = None,
-                    districts_excluded: Union[dict, list] = {},
-                    dates_included: Optional[Iterable[date]] = None,
-                    dates_excluded: Iterable[date] = {}) -> List[Weather]:
-        if not isinstance(url, str):
-            weathers: List[Weather] = []
-            for u in url:
-                weathers.extend(
-                    self.getWeathers(u, districts_included, districts_excluded,
-                                     dates_included, dates_excluded))
-            return weathers
-        resp: Response = self.session.get(self.base_url + url)
-        resp.encoding = resp.apparent_encoding
-        bs: BeautifulSoup = BeautifulSoup(resp.text, 'lxml')
+            dates_excluded: Iterable[date] = {},
+            weather_filter: Optional[WeatherFilter] = None,
+            max_workers: int = 1,
+            max_in_flight: Optional[int] = None) -> List[Weather]:
+        return self.refreshWeathers(self.getAreasList().values(),
+                                    districts_included, districts_excluded,
+                                    dates_included, dates_excluded,
+                                    weather_filter, max_workers, max_in_flight)
+
+    def refreshWeathers(
+            self,
+            url: Union[str, Iterable[str]],
+            districts_included: Optional[Union[dict, list]] = None,
+            districts_excluded: Union[dict, list] = {},
+            dates_included: Optional[Iterable[date]] = None,
+            dates_excluded: Iterable[date] = {},
+            weather_filter: Optional[WeatherFilter] = None,
+            max_workers: int = 1,
+            max_in_flight: Optional[int] = None) -> List[Weather]:
+        """获取天气预报，适用于反复轮询，参数同 getWeathers
+
+        记录各页面的 ETag、Last-Modified 及更新时间，并缓存页面中全部的天气预报。
+        再次获取时附带条件请求头；服务器返回 304，或读到页面头部的更新时间未变时，
+        即停止读取，直接过滤缓存的天气预报，不再下载及解析整个页面。
+        """
+        flt: WeatherFilter = self._compileFilter(districts_included,
+                                                 districts_excluded,
+                                                 dates_included,
+                                                 dates_excluded, weather_filter)
+        urls: Iterable[str] = [url] if isinstance(url, str) else url
+        pages: Iterable[List[Weather]]
+        if max_workers <= 1:
+            pages = map(self._refreshPage, urls)
+        else:
+            pages = orderedMap(self._refreshPage, urls, max_workers,
+                               max_in_flight)
+        if self.instrument is None:
+            return [w for page in pages for w in flt.filter(page)]
+        weathers: List[Weather] = []
+        for page in pages:
+            kept: List[Weather] = list(flt.filter(page))
+            count(self.instrument,
+                  'rows_filtered',
+                  len(page) - len(kept),
+                  crawler='forecast')
+            weathers.extend(kept)
+        return weathers
+
+    def _refreshPage(self, u: str) -> List[Weather]:
+        "获取单个页面中全部的天气预报，页面未更新时返回缓存的结果"
+        url: str = self.base_url + u
+        state: Optional[_PageState] = self._page_states.get(url)
+        headers: Dict[str, str] = {}
+        if state is not None:
+            if state.etag is not None:
+                headers['If-None-Match'] = state.etag
+            if state.last_modified is not None:
+                headers['If-Modified-Since'] = state.last_modified
+        inst: Optional[Instrument] = self.instrument
+        content: Optional[bytes] = None
+        update_stamp: Optional[bytes] = None
+        with span(inst, 'fetch', crawler='forecast', url=url):
+            resp: Response = self.session.get(url,
+                                              headers=headers,
+                                              stream=True)
+            with resp:
+                if state is None or resp.status_code != 304:
+                    chunks: Iterator[bytes] = resp.iter_content(8192)
+                    head: bytes = b''
+                    match = None
+                    for chunk in chunks:
+                        head += chunk
+                        match = _update_time_re.search(head)
+                        if match is not None or len(head) > 65536:
+                            break
+                    update_stamp = match and match.group(1)
+                    count(inst, 'bytes_fetched', len(head), crawler='forecast',
+                          url=url)
+                    if (state is None or update_stamp is None
+                            or update_stamp != state.update_stamp):
+                        content = head + b''.join(chunks)
+        if content is None:
+            assert state is not None
+            count(inst, 'cache_hits', 1, crawler='forecast', cache='refresh')
+            return state.weathers
+        count(inst,
+              'bytes_fetched',
+              len(content) - len(head),
+              crawler='forecast',
+              url=url)
+        count(inst, 'cache_misses', 1, crawler='forecast', cache='refresh')
+        with span(inst, 'decode', crawler='forecast', url=url):
+            text: str = decodeContent(url, content,
+                                      resp.headers.get('Content-Type'))
+        if inst is None:
+            weathers: List[Weather] = self._parseWeathers(
+                text, None, self.engine, self.output)
+        else:
+            with span(inst, 'parse', crawler='forecast', url=url):
+                rows: List[tuple] = list(
+                    self._iterPageRows(text, None, self.engine))
+            count(inst, 'rows_parsed', len(rows), crawler='forecast', url=url)
+            build = getattr(self, self.OUTPUTS[self.output])
+            with span(inst, 'build', crawler='forecast', url=url):
+                weathers = [build(row) for row in rows]
+        self._page_states[url] = _PageState(resp.headers.get('ETag'),
+                                            resp.headers.get('Last-Modified'),
+                                            update_stamp, weathers)
+        return weathers
+
+    def _iterPages(self, urls: Iterable[str], parse: Callable[[str],
+                                                              Iterable[_T]],
+                   max_workers: int, max_in_flight: Optional[int],
+                   parse_executor: Optional[Executor]) -> Iterator[Iterable[_T]]:
+        """下载并解析各页面，按 urls 的顺序产出各页面的解析结果
+
+        parse 解析单个页面的源码，交给 parse_executor 执行时须能被 pickle。
+        顺序获取时直接产出 parse 的返回值（可以是惰性的迭代器），否则产出列表
+        """
+        inst: Optional[Instrument] = self.instrument
+        if max_workers <= 1 and parse_executor is None and inst is None:
+            for u in urls:
+                yield parse(self._fetchPage(self.base_url + u))
+            return
+
+        def getPage(u: str) -> List[_T]:
+            text: str = self._fetchPage(self.base_url + u)
+            with span(inst, 'parse', crawler='forecast', url=self.base_url + u):
+                if parse_executor is None:
+                    page: List[_T] = list(parse(text))
+                else:
+                    page = parse_executor.submit(_parseList, parse,
+                                                 text).result()
+            if inst is not None:
+                count(inst,
+                      'rows_parsed',
+                      len(page),
+                      crawler='forecast',
+                      url=self.base_url + u)
+                # 被过滤的行（含被跳过的标签页中的）未被解析，以页面中的总行数计算
+                count(inst,
+                      'rows_filtered',
+                      _countRows(text) - len(page),
+                      crawler='forecast',
+                      url=self.base_url + u)
+            return page
+
+        if max_workers <= 1:
+            yield from map(getPage, urls)
+        else:
+            yield from orderedMap(getPage, urls, max_workers, max_in_flight)
+
+    def _fetchPage(self, url: str) -> str:
+        inst: Optional[Instrument] = self.instrument
+        # 刚为获取列表而下载的页面只复用一次
+        text: Optional[str] = self._list_page.pop(url)
+        if text is not None:
+            count(inst, 'cache_hits', 1, crawler='forecast', cache='list_page')
+            return text
+        text = self.page_cache.get(url)
+        if text is None:
+            count(inst, 'cache_misses', 1, crawler='forecast', cache='page')
+            with span(inst, 'fetch', crawler='forecast', url=url):
+                resp: Response = self.session.get(url)
+                content: bytes = resp.content
+            count(inst, 'bytes_fetched', len(content), crawler='forecast',
+                  url=url)
+            with span(inst, 'decode', crawler='forecast', url=url):
+                text = decodeResponse(resp)
+            if self.page_cache.ttl:
+                self.page_cache.put(url, text)
+        else:
+            count(inst, 'cache_hits', 1, crawler='forecast', cache='page')
+        return text
+
+    @classmethod
+    def _parseWeathers(cls,
+                       text: str,
+                       weather_filter: Optional[WeatherFilter] = None,
+                       engine: str = 'bs4',
+                       output: str = 'model') -> List[Weather]:
+        "解析单个天气预报页面"
+        return list(cls._iterPageWeathers(text, weather_filter, engine,
+                                          output))
+
+    @classmethod
+    def _iterPageWeathers(cls,
+                          text: str,
+                          weather_filter: Optional[WeatherFilter] = None,
+                          engine: str = 'bs4',
+                          output: str = 'model') -> Iterator[Weather]:
+        build = getattr(cls, cls.OUTPUTS[output])
+        for row in cls._iterPageRows(text, weather_filter, engine):
+            yield build(row)
+
+    @classmethod
+    def _iterPageRows(cls,
+                      text: str,
+                      weather_filter: Optional[WeatherFilter] = None,
+                      engine: str = 'bs4') -> Iterator[tuple]:
+        "以 engine 解析单个页面，产出的行见 _buildWeather"
+        return getattr(cls, cls.ENGINES[engine])(text, weather_filter or
+                                                 WeatherFilter())
+
+    @staticmethod
+    def _buildWeather(row: tuple) -> Weather:
+        """由解析引擎产出的行构造 Weather
+
+        行的各项依次为：省、省网址、市、县/区、县/区编号、日期、更新时间、
+        白天天气现象、白天风向、白天风力、最高气温、
+        夜间天气现象、夜间风向、夜间风力、最低气温；无白天天气时白天各项为 None
+        """
+        return Weather(
+            province=row[0],
+            province_url=row[1],
+            city=row[2],
+            district=row[3],
+            district_id=row[4],
+            date=row[5],
+            update_time=row[6],
+            day_weather=None if row[7] is None else WeatherInfo(
+                event=row[7], wind_dir=row[8], wind_scale=row[9]),
+            night_weather=WeatherInfo(event=row[11],
+                                      wind_dir=row[12],
+                                      wind_scale=row[13]),
+            temp_max=row[10],
+            temp_min=row[14])
+
+    @staticmethod
+    def _constructWeather(row: tuple) -> Weather:
+        "同 _buildWeather，但不经 pydantic 校验"
+        return Weather.construct(
+            province=row[0],
+            province_url=row[1],
+            city=row[2],
+            district=row[3],
+            district_id=row[4],
+            date=row[5],
+            update_time=row[6],
+            day_weather=None if row[7] is None else WeatherInfo.construct(
+                event=row[7], wind_dir=row[8], wind_scale=row[9]),
+            night_weather=WeatherInfo.construct(event=row[11],
+                                                wind_dir=row[12],
+                                                wind_scale=row[13]),
+            temp_max=row[10],
+            temp_min=row[14])
+
+    @staticmethod
+    def _buildWeatherRecord(row: tuple) -> WeatherRecord:
+        return WeatherRecord(
+            row[0], row[1], row[2], row[3], row[4], row[5], row[6],
+            None if row[7] is None else WeatherInfoRecord(
+                row[7], row[8], row[9]),
+            WeatherInfoRecord(row[11], row[12], row[13]), row[10], row[14])
+
+    @classmethod
+    def _iterRowsBs4(cls, text: str,
+                     weather_filter: WeatherFilter) -> Iterator[tuple]:
+        """以 BeautifulSoup 解析页面
+
+        先只解析各日期标签页之前的部分，被日期过滤器过滤的标签页不会被解析；
+        整个省（或市）被过滤时，在读到其表格的左侧表头后即跳过该表格
+        """
+        head, tabs_text = _splitTabs(text)
+        bs: BeautifulSoup = BeautifulSoup(head, 'lxml')
 
         content: element.Tag = bs.find('div', attrs={'class': 'contentboxTab'})
 
@@ -131,7 +675,7 @@ class WeatherCrawler():
                                          int(dt_str[8:10]),
                                          int(dt_str[11:13]),
                                          int(dt_str[14:16]),
-                                         tzinfo=self.TIMEZONE)
+                                         tzinfo=cls.TIMEZONE)
 
         area_a: element.Tag = dt_span.findPrevious('a')
         province_tmp: str = area_a.text
@@ -139,24 +683,36 @@ class WeatherCrawler():
 
         # 是否为省级行政单位的天气预报页面（除了省级以外，还有一种是如“西南”这种更大的区域的）
         is_province_page: bool = province_tmp in provinces
-        if is_province_page and self._isDistrictUnmatch(
-            [province_tmp, '', ''], districts_included,
-                districts_excluded) == 1:
-            return []
-        weathers = []
+        if is_province_page and weather_filter.isDistrictUnmatch(
+                province_tmp, '', '') == 1:
+            return
         dates: List[date] = []
-        weather_all_tabs: List[element.Tag] = content.find(
-            'div', attrs={
-                'class': 'hanml'
-            }).findAll('div', attrs={'class': 'conMidtab'})
         weather_tabs: List[element.Tag] = []
         date_tmp: date
+        date_lis: List[element.Tag] = content.find('ul',
+                                                   attrs={
+                                                       'class': 'day_tabs'
+                                                   }).findAll('li')
+
+        def parseTab(n: int) -> element.Tag:
+            return BeautifulSoup(tabs_text[n], 'lxml').find(
+                'div', attrs={'class': 'conMidtab'})
+
+        getTab: Callable[[int], element.Tag]
+        if len(tabs_text) == len(date_lis):
+            getTab = parseTab
+        else:  # 无法按标签页切分，解析整个页面
+            if tabs_text:
+                content = BeautifulSoup(text, 'lxml').find(
+                    'div', attrs={'class': 'contentboxTab'})
+            weather_all_tabs: List[element.Tag] = content.find(
+                'div', attrs={
+                    'class': 'hanml'
+                }).findAll('div', attrs={'class': 'conMidtab'})
+            getTab = weather_all_tabs.__getitem__
 
         # 获取提供天气预报的日期
-        for n, date_li in enumerate(
-                content.find('ul', attrs={
-                    'class': 'day_tabs'
-                }).findAll('li')):
+        for n, date_li in enumerate(date_lis):
             date_str: List[str] = date_li.text[date_li.text.find('(') +
                                                1:-2].split('月')
             month: int = int(date_str[0])
@@ -165,9 +721,8 @@ class WeatherCrawler():
                 date_tmp = date(update_time.year - 1, month, day)
             else:
                 date_tmp = date(update_time.year, month, day)
-            if not self._isDateUnmatch(date_tmp, dates_included,
-                                       dates_excluded):
-                weather_tabs.append(weather_all_tabs[n])
+            if not weather_filter.isDateUnmatch(date_tmp):
+                weather_tabs.append(getTab(n))
                 dates.append(date_tmp)
 
         # 以日期为单位的迭代
@@ -199,14 +754,21 @@ class WeatherCrawler():
                             is_provincial_city = province in provincial_cities
                             if is_provincial_city:
                                 city = province
+                            # 整个省（或市）被过滤，跳过表格的其余部分
+                            if is_provincial_city or is_province_page:
+                                if weather_filter.isDistrictUnmatch(
+                                        province, city, '') in (1, 2):
+                                    break
+                            elif weather_filter.isDistrictUnmatch(
+                                    province, '', '') == 1:
+                                break
                             tds = tds[1:]
                         district: str = tds[0].text.strip()
                         district_url: str = tds[0].find('a')['href']
                         if not (is_provincial_city or is_province_page):
                             city = district
-                        unmatch_no: int = self._isDistrictUnmatch(
-                            [province, city, district], districts_included,
-                            districts_excluded)
+                        unmatch_no: int = weather_filter.isDistrictUnmatch(
+                            province, city, district)
                         if unmatch_no == 3:  # 区县级行政单位被过滤
                             continue
                         elif unmatch_no == 2:  # 整个市级行政单位被过滤
@@ -219,33 +781,144 @@ class WeatherCrawler():
                         if tds[1].text != '-':
                             day_wind_spans: List[element.Tag] = tds[2].findAll(
                                 'span')
-                            day_weather: Optional[WeatherInfo] = WeatherInfo(
-                                event=tds[1].text,
-                                wind_dir=day_wind_spans[0].text,
-                                wind_scale=day_wind_spans[1].text)
+                            yield (province, province_url, city, district,
+                                   int(district_url[-15:-6]), date_tmp,
+                                   update_time, tds[1].text,
+                                   day_wind_spans[0].text,
+                                   day_wind_spans[1].text, int(tds[3].text),
+                                   *cls._nightBs4(tds))
                         else:
-                            day_weather = None
-                        night_wind_spans: List[element.Tag] = tds[5].findAll(
-                            'span')
-
-                        night_weather: WeatherInfo = WeatherInfo(
-                            event=tds[4].text,
-                            wind_dir=night_wind_spans[0].text,
-                            wind_scale=night_wind_spans[1].text)
-                        weathers.append(
-                            Weather(province=province,
-                                    province_url=province_url,
-                                    city=city,
-                                    district=district,
-                                    district_id=int(district_url[-15:-6]),
-                                    date=date_tmp,
-                                    update_time=update_time,
-                                    day_weather=day_weather,
-                                    night_weather=night_weather,
-                                    temp_max=int(tds[3].text)
-                                    if day_weather else None,
-                                    temp_min=int(tds[6].text)))
-        return weathers
+                            yield (province, province_url, city, district,
+                                   int(district_url[-15:-6]), date_tmp,
+                                   update_time, None, None, None, None,
+                                   *cls._nightBs4(tds))
+
+    @staticmethod
+    def _nightBs4(tds: List[element.Tag]) -> tuple:
+        night_wind_spans: List[element.Tag] = tds[5].findAll('span')
+        return (tds[4].text, night_wind_spans[0].text,
+                night_wind_spans[1].text, int(tds[6].text))
+
+    @classmethod
+    def _iterRowsLxml(cls, text: str,
+                      weather_filter: WeatherFilter) -> Iterator[tuple]:
+        """以 lxml 解析页面
+
+        不构造 BeautifulSoup 树，直接以预编译的 XPath 定位所需的元素，
+        每个单元格的文本只取一次；结果与 _iterRowsBs4 一致。
+        被日期过滤器过滤的标签页不会被解析；
+        整个省（或市）被过滤时，在读到其表格的左侧表头后即跳过该表格
+        """
+        head, tabs_text = _splitTabs(text)
+        content: etree._Element = _xpath_content(
+            lxml_html.document_fromstring(head))[0]
+
+        # 获取天气预报更新时间
+        dt_span: etree._Element = next(content.iter('span'))
+        dt_str: str = _xpath_text(dt_span).strip()[-16:]
+        update_time: datetime = datetime(int(dt_str[:4]),
+                                         int(dt_str[5:7]),
+                                         int(dt_str[8:10]),
+                                         int(dt_str[11:13]),
+                                         int(dt_str[14:16]),
+                                         tzinfo=cls.TIMEZONE)
+
+        area_a: etree._Element = _xpath_previous_a(dt_span)[0]
+        province_tmp: str = _xpath_text(area_a)
+        province_url_tmp: str = area_a.get('href')
+
+        is_province_page: bool = province_tmp in provinces
+        if is_province_page and weather_filter.isDistrictUnmatch(
+                province_tmp, '', '') == 1:
+            return
+        date_tmp: date
+        date_lis: List[etree._Element] = list(
+            _xpath_day_tabs(content)[0].iter('li'))
+
+        def parseTab(n: int) -> etree._Element:
+            return _xpath_tabs(lxml_html.document_fromstring(tabs_text[n]))[0]
+
+        getTab: Callable[[int], etree._Element]
+        if len(tabs_text) == len(date_lis):
+            getTab = parseTab
+        else:  # 无法按标签页切分，解析整个页面
+            if tabs_text:
+                content = _xpath_content(lxml_html.document_fromstring(text))[0]
+            getTab = _xpath_tabs(_xpath_hanml(content)[0]).__getitem__
+
+        for n, date_li in enumerate(date_lis):
+            li_text: str = _xpath_text(date_li)
+            date_str: List[str] = li_text[li_text.find('(') + 1:-2].split('月')
+            month: int = int(date_str[0])
+            day: int = int(date_str[1])
+            if month < update_time.month:
+                date_tmp = date(update_time.year - 1, month, day)
+            else:
+                date_tmp = date(update_time.year, month, day)
+            if weather_filter.isDateUnmatch(date_tmp):
+                continue
+            for weather_div in getTab(n):
+                if weather_div.tag != 'div':
+                    continue
+                for tr in weather_div.iter('tr'):
+                    is_provincial_city: bool
+                    city: str
+                    province: str
+                    province_url: str
+                    tds: List[etree._Element] = list(tr.iter('td'))
+                    texts: List[str] = [_xpath_text(td) for td in tds]
+                    if (texts[2][-2:] == '白天' and texts[3][-2:] == '夜间'
+                        ) or texts[0] == '天气现象':  # 该行为上侧的表头
+                        continue
+                    if (tds[0].get('class') or '').split() == ['rowsPan']:
+                        if is_province_page:
+                            city = texts[0].strip()
+                            province = province_tmp
+                            province_url = province_url_tmp
+                        else:
+                            province = texts[0].strip()
+                            province_url = next(tds[0].iter('a')).get('href')
+                        is_provincial_city = province in provincial_cities
+                        if is_provincial_city:
+                            city = province
+                        # 整个省（或市）被过滤，跳过表格的其余部分
+                        if is_provincial_city or is_province_page:
+                            if weather_filter.isDistrictUnmatch(
+                                    province, city, '') in (1, 2):
+                                break
+                        elif weather_filter.isDistrictUnmatch(
+                                province, '', '') == 1:
+                            break
+                        tds = tds[1:]
+                        texts = texts[1:]
+                    district: str = texts[0].strip()
+                    district_url: str = next(tds[0].iter('a')).get('href')
+                    if not (is_provincial_city or is_province_page):
+                        city = district
+                    unmatch_no: int = weather_filter.isDistrictUnmatch(
+                        province, city, district)
+                    if unmatch_no == 3:
+                        continue
+                    elif unmatch_no == 2:
+                        if is_provincial_city or is_province_page:
+                            break
+                        else:
+                            continue
+                    elif unmatch_no == 1:
+                        break
+                    night_wind: List[str] = _spanTexts(tds[5])
+                    if texts[1] != '-':
+                        day_wind: List[str] = _spanTexts(tds[2])
+                        yield (province, province_url, city, district,
+                               int(district_url[-15:-6]), date_tmp,
+                               update_time, texts[1], day_wind[0],
+                               day_wind[1], int(texts[3]), texts[4],
+                               night_wind[0], night_wind[1], int(texts[6]))
+                    else:
+                        yield (province, province_url, city, district,
+                               int(district_url[-15:-6]), date_tmp,
+                               update_time, None, None, None, None, texts[4],
+                               night_wind[0], night_wind[1], int(texts[6]))
 
     def getSession(self) -> Session:
         return self.session
@@ -0,0 +1,326 @@
+"""天气预报及气象预警的历史记录（SQLite）
+
+每次获取的天气预报、预警及预警详情可批量存入同一数据库，之后按地区编号前缀、日期、
+预警类型及级别等查询。天气预报以（区县编号，日期，更新时间）为主键，
+重复存入同一次更新的天气预报时忽略；预警以 short_url、预警详情以 alarm_id 为主键。
+"""
+from datetime import date, datetime, timedelta, timezone
+from threading import RLock
+from typing import Any, Iterable, List, Optional, Tuple, Union
+import json
+import sqlite3
+from .model import (Alarm, AlarmDetail, AlarmKind, AlarmLevel, AlarmRecord,
+                    Weather, WeatherInfo, WeatherRecord)
+__all__ = ('HistoryStore',)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS weathers (
+    district_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    update_time INTEGER NOT NULL,
+    province TEXT NOT NULL,
+    province_url TEXT NOT NULL,
+    city TEXT NOT NULL,
+    district TEXT NOT NULL,
+    day_event TEXT,
+    day_wind_dir TEXT,
+    day_wind_scale TEXT,
+    night_event TEXT NOT NULL,
+    night_wind_dir TEXT NOT NULL,
+    night_wind_scale TEXT NOT NULL,
+    temp_max INTEGER,
+    temp_min INTEGER NOT NULL,
+    PRIMARY KEY (district_id, date, update_time)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS weathers_date ON weathers (date, district_id);
+CREATE INDEX IF NOT EXISTS weathers_update_time ON weathers (update_time);
+CREATE TABLE IF NOT EXISTS alarms (
+    short_url TEXT PRIMARY KEY,
+    location TEXT NOT NULL,
+    lng_E REAL NOT NULL,
+    lat_N REAL NOT NULL,
+    location_id TEXT NOT NULL,
+    kind INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    time INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS alarms_location ON alarms (location_id, time);
+CREATE INDEX IF NOT EXISTS alarms_kind ON alarms (kind, time);
+CREATE INDEX IF NOT EXISTS alarms_level ON alarms (level, time);
+CREATE INDEX IF NOT EXISTS alarms_time ON alarms (time);
+CREATE TABLE IF NOT EXISTS alarm_details (
+    alarm_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    province_name TEXT NOT NULL,
+    city_name TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    relieve_time INTEGER NOT NULL,
+    kind INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    raw_info TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS alarm_details_kind ON alarm_details (kind, time);
+CREATE INDEX IF NOT EXISTS alarm_details_level ON alarm_details (level, time);
+CREATE INDEX IF NOT EXISTS alarm_details_time ON alarm_details (time);
+'''
+
+_WEATHER_COLUMNS = ('district_id, date, update_time, province, province_url, '
+                    'city, district, day_event, day_wind_dir, day_wind_scale, '
+                    'night_event, night_wind_dir, night_wind_scale, '
+                    'temp_max, temp_min')
+_ALARM_COLUMNS = 'short_url, location, lng_E, lat_N, location_id, kind, ' \
+    'level, time'
+_ALARM_DETAIL_COLUMNS = 'alarm_id, title, province_name, city_name, time, ' \
+    'content, relieve_time, kind, level, raw_info'
+
+
+class HistoryStore():
+    """天气预报及气象预警的历史记录
+
+    path 为 SQLite 数据库文件，默认仅在内存中。各 add 方法每 batch_size 行
+    提交一次事务，返回实际新增的行数；各 query 方法的条件均可省略，
+    地区编号按前缀匹配（如 10128 匹配广东的全部区县），日期及时间的范围均含两端。
+    可在多个线程中共用。
+    """
+    VERSION: int = 1
+    TIMEZONE: timezone = timezone(timedelta(hours=8), "Asia/Shanghai")
+    path: str
+
+    def __init__(self, path: str = ':memory:', batch_size: int = 10000):
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = RLock()
+        self._conn: sqlite3.Connection = sqlite3.connect(
+            path, check_same_thread=False)
+        version: int = self._conn.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, self.VERSION):
+            self._conn.close()
+            raise ValueError(f'unknown version: {version!r}')
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode = WAL')
+            self._conn.execute('PRAGMA synchronous = NORMAL')
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute(f'PRAGMA user_version = {self.VERSION}')
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> 'HistoryStore':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @classmethod
+    def _timestamp(cls, time: datetime) -> int:
+        "不含时区的时间视为北京时间"
+        if time.tzinfo is None:
+            time = time.replace(tzinfo=cls.TIMEZONE)
+        return int(time.timestamp())
+
+    def _datetime(self, timestamp: int) -> datetime:
+        return datetime.fromtimestamp(timestamp, self.TIMEZONE)
+
+    def _insert(self, table: str, columns: str, rows: Iterable[tuple]) -> int:
+        "以 INSERT OR IGNORE 分批插入，返回实际新增的行数"
+        sql: str = f'INSERT OR IGNORE INTO {table} ({columns}) VALUES ' \
+            f'({", ".join("?" * (columns.count(",") + 1))})'
+        inserted: int = 0
+        batch: List[tuple] = []
+        with self._lock:
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    inserted += self._insertBatch(sql, batch)
+                    batch = []
+            if batch:
+                inserted += self._insertBatch(sql, batch)
+        return inserted
+
+    def _insertBatch(self, sql: str, batch: List[tuple]) -> int:
+        before: int = self._conn.total_changes
+        with self._conn:
+            self._conn.executemany(sql, batch)
+        return self._conn.total_changes - before
+
+    def addWeathers(self, weathers: Iterable[Union[Weather,
+                                                   WeatherRecord]]) -> int:
+        "存入天气预报，已有相同（区县编号，日期，更新时间）的忽略"
+        return self._insert(
+            'weathers', _WEATHER_COLUMNS,
+            ((w.district_id, w.date.isoformat(),
+              self._timestamp(w.update_time), w.province, w.province_url,
+              w.city, w.district,
+              *((None, None, None) if w.day_weather is None else
+                (w.day_weather.event, w.day_weather.wind_dir,
+                 w.day_weather.wind_scale)), w.night_weather.event,
+              w.night_weather.wind_dir, w.night_weather.wind_scale,
+              w.temp_max, w.temp_min) for w in weathers))
+
+    def addAlarms(self, alarms: Iterable[Union[Alarm, AlarmRecord]]) -> int:
+        "存入预警，已有相同 short_url 的忽略"
+        return self._insert(
+            'alarms', _ALARM_COLUMNS,
+            ((a.short_url, a.location, a.lng_E, a.lat_N, str(a.location_id),
+              a.kind.value, a.level.value, self._timestamp(a.time))
+             for a in alarms))
+
+    def addAlarmDetails(self, details: Iterable[AlarmDetail]) -> int:
+        "存入预警详情，已有相同 alarm_id 的忽略"
+        return self._insert(
+            'alarm_details', _ALARM_DETAIL_COLUMNS,
+            ((d.alarm_id, d.title, d.province_name, d.city_name,
+              self._timestamp(d.time), d.content,
+              self._timestamp(d.relieve_time), d.kind.value, d.level.value,
+              json.dumps(d.raw_info, ensure_ascii=False)) for d in details))
+
+    @staticmethod
+    def _idRange(prefix: Union[int, str], digits: int = 9) -> Tuple[int, int]:
+        "以 prefix 开头的 digits 位编号的范围（左闭右开）"
+        scale: int = 10**max(digits - len(str(prefix)), 0)
+        return int(prefix) * scale, (int(prefix) + 1) * scale
+
+    @staticmethod
+    def _textRange(prefix: Union[int, str]) -> Tuple[str, str]:
+        "以 prefix 开头的数字串的范围（左闭右开），可利用索引"
+        prefix = str(prefix)
+        return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+    def _query(self, sql: str, conditions: List[str], params: List[Any],
+               order: str) -> List[tuple]:
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += f' ORDER BY {order}'
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def queryWeathers(self,
+                      district_prefix: Optional[Union[int, str]] = None,
+                      date_from: Optional[date] = None,
+                      date_to: Optional[date] = None,
+                      updated_from: Optional[datetime] = None,
+                      updated_to: Optional[datetime] = None) -> List[Weather]:
+        "查询天气预报，按区县编号、日期、更新时间排列"
+        conditions: List[str] = []
+        params: List[Any] = []
+        if district_prefix is not None:
+            conditions.append('district_id >= ? AND district_id < ?')
+            params.extend(self._idRange(district_prefix))
+        if date_from is not None:
+            conditions.append('date >= ?')
+            params.append(date_from.isoformat())
+        if date_to is not None:
+            conditions.append('date <= ?')
+            params.append(date_to.isoformat())
+        if updated_from is not None:
+            conditions.append('update_time >= ?')
+            params.append(self._timestamp(updated_from))
+        if updated_to is not None:
+            conditions.append('update_time <= ?')
+            params.append(self._timestamp(updated_to))
+        return [
+            self._buildWeather(row) for row in self._query(
+                f'SELECT {_WEATHER_COLUMNS} FROM weathers', conditions, params,
+                'district_id, date, update_time')
+        ]
+
+    def getWeatherHistory(self, district_id: int,
+                          date_: date) -> List[Weather]:
+        "某区县某日的天气预报在各次更新中的变化，按更新时间排列"
+        return [
+            self._buildWeather(row) for row in self._query(
+                f'SELECT {_WEATHER_COLUMNS} FROM weathers',
+                ['district_id = ?', 'date = ?'],
+                [district_id, date_.isoformat()], 'update_time')
+        ]
+
+    def _buildWeather(self, row: tuple) -> Weather:
+        return Weather.construct(
+            district_id=row[0],
+            date=date.fromisoformat(row[1]),
+            update_time=self._datetime(row[2]),
+            province=row[3],
+            province_url=row[4],
+            city=row[5],
+            district=row[6],
+            day_weather=None if row[7] is None else WeatherInfo.construct(
+                event=row[7], wind_dir=row[8], wind_scale=row[9]),
+            night_weather=WeatherInfo.construct(event=row[10],
+                                                wind_dir=row[11],
+                                                wind_scale=row[12]),
+            temp_max=row[13],
+            temp_min=row[14])
+
+    def _alarmConditions(self, kind: Optional[AlarmKind],
+                         level: Optional[AlarmLevel],
+                         time_from: Optional[datetime],
+                         time_to: Optional[datetime]
+                         ) -> Tuple[List[str], List[Any]]:
+        conditions: List[str] = []
+        params: List[Any] = []
+        if kind is not None:
+            conditions.append('kind = ?')
+            params.append(AlarmKind(kind).value)
+        if level is not None:
+            conditions.append('level = ?')
+            params.append(AlarmLevel(level).value)
+        if time_from is not None:
+            conditions.append('time >= ?')
+            params.append(self._timestamp(time_from))
+        if time_to is not None:
+            conditions.append('time <= ?')
+            params.append(self._timestamp(time_to))
+        return conditions, params
+
+    def queryAlarms(self,
+                    location_prefix: Optional[Union[int, str]] = None,
+                    kind: Optional[AlarmKind] = None,
+                    level: Optional[AlarmLevel] = None,
+                    time_from: Optional[datetime] = None,
+                    time_to: Optional[datetime] = None) -> List[Alarm]:
+        "查询预警，按时间排列"
+        conditions, params = self._alarmConditions(kind, level, time_from,
+                                                   time_to)
+        if location_prefix is not None:
+            conditions.append('location_id >= ? AND location_id < ?')
+            params.extend(self._textRange(location_prefix))
+        return [
+            Alarm.construct(short_url=row[0],
+                            location=row[1],
+                            lng_E=row[2],
+                            lat_N=row[3],
+                            location_id=int(row[4]),
+                            kind=AlarmKind(row[5]),
+                            level=AlarmLevel(row[6]),
+                            time=self._datetime(row[7]))
+            for row in self._query(f'SELECT {_ALARM_COLUMNS} FROM alarms',
+                                   conditions, params, 'time, short_url')
+        ]
+
+    def queryAlarmDetails(self,
+                          kind: Optional[AlarmKind] = None,
+                          level: Optional[AlarmLevel] = None,
+                          time_from: Optional[datetime] = None,
+                          time_to: Optional[datetime] = None
+                          ) -> List[AlarmDetail]:
+        "查询预警详情，按时间排列"
+        conditions, params = self._alarmConditions(kind, level, time_from,
+                                                   time_to)
+        return [
+            AlarmDetail.construct(alarm_id=row[0],
+                                  title=row[1],
+                                  province_name=row[2],
+                                  city_name=row[3],
+                                  time=self._datetime(row[4]),
+                                  content=row[5],
+                                  relieve_time=self._datetime(row[6]),
+                                  kind=AlarmKind(row[7]),
+                                  level=AlarmLevel(row[8]),
+                                  raw_info=json.loads(row[9]))
+            for row in self._query(
+                f'SELECT {_ALARM_DETAIL_COLUMNS} FROM alarm_details',
+                conditions, params, 'time, alarm_id')
+        ]
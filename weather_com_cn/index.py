@@ -0,0 +1,212 @@
+"气象预警的空间索引及地区编号索引"
+from heapq import nsmallest
+from math import asin, cos, degrees, floor, radians, sin, sqrt
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from .model import Alarm
+__all__ = ('AlarmIndex',)
+
+EARTH_RADIUS: float = 6371.0088
+"地球平均半径（千米）"
+
+
+def distance(lng1: float, lat1: float, lng2: float, lat2: float) -> float:
+    "两点间的大圆距离（千米）"
+    lng1, lat1, lng2, lat2 = map(radians, (lng1, lat1, lng2, lat2))
+    h = sin((lat2 - lat1) / 2)**2 + cos(lat1) * cos(lat2) * sin(
+        (lng2 - lng1) / 2)**2
+    return 2 * EARTH_RADIUS * asin(min(1.0, sqrt(h)))
+
+
+class _TrieNode():
+    "地区编号前缀树的节点，每位数字一级"
+    __slots__ = ('children', 'keys')
+    children: Dict[str, '_TrieNode']
+    keys: Set[str]
+    "编号恰为该前缀的预警"
+
+    def __init__(self):
+        self.children = {}
+        self.keys = set()
+
+
+class AlarmIndex():
+    """气象预警的索引
+
+    以 short_url 为键保存预警，并维护两个索引：
+    按经纬度划分的网格（边长 cell_size 度），用于最近邻及半径范围查询；
+    地区编号的前缀树，用于查询覆盖某地区或位于某地区内的预警。
+    两者均支持逐个插入及删除，可配合 AlarmPoller.poll 的结果增量更新。
+    """
+    cell_size: float
+    alarms: Dict[str, Alarm]
+    "全部预警，以 short_url 为键"
+
+    def __init__(self,
+                 alarms: Iterable[Alarm] = (),
+                 cell_size: float = 1.0):
+        self.cell_size = cell_size
+        self.alarms = {}
+        self._cells: Dict[Tuple[int, int], Set[str]] = {}
+        self._trie: _TrieNode = _TrieNode()
+        for alarm in alarms:
+            self.insert(alarm)
+
+    def __len__(self) -> int:
+        return len(self.alarms)
+
+    def __contains__(self, short_url: str) -> bool:
+        return short_url in self.alarms
+
+    def __iter__(self) -> Iterator[Alarm]:
+        return iter(self.alarms.values())
+
+    def _cell(self, lng: float, lat: float) -> Tuple[int, int]:
+        return floor(lng / self.cell_size), floor(lat / self.cell_size)
+
+    def insert(self, alarm: Alarm) -> None:
+        "插入预警，已有相同 short_url 的预警时将其替换"
+        if alarm.short_url in self.alarms:
+            self.remove(alarm.short_url)
+        self.alarms[alarm.short_url] = alarm
+        self._cells.setdefault(self._cell(alarm.lng_E, alarm.lat_N),
+                               set()).add(alarm.short_url)
+        node: _TrieNode = self._trie
+        for digit in str(alarm.location_id):
+            child: Optional[_TrieNode] = node.children.get(digit)
+            if child is None:
+                child = node.children[digit] = _TrieNode()
+            node = child
+        node.keys.add(alarm.short_url)
+
+    def remove(self, short_url: str) -> Optional[Alarm]:
+        "删除预警，返回被删除的预警，不存在时返回 None"
+        alarm: Optional[Alarm] = self.alarms.pop(short_url, None)
+        if alarm is None:
+            return None
+        cell = self._cell(alarm.lng_E, alarm.lat_N)
+        self._cells[cell].discard(short_url)
+        if not self._cells[cell]:
+            del self._cells[cell]
+        path: List[Tuple[_TrieNode, str]] = []
+        node: _TrieNode = self._trie
+        for digit in str(alarm.location_id):
+            path.append((node, digit))
+            node = node.children[digit]
+        node.keys.discard(short_url)
+        # 清理空的节点
+        for parent, digit in reversed(path):
+            child = parent.children[digit]
+            if child.keys or child.children:
+                break
+            del parent.children[digit]
+        return alarm
+
+    def update(self, added: Iterable[Alarm],
+               removed: Iterable[Alarm] = ()) -> None:
+        "按（新增的预警，解除的预警）更新，参数同 AlarmPoller.poll 的返回值"
+        for alarm in removed:
+            self.remove(alarm.short_url)
+        for alarm in added:
+            self.insert(alarm)
+
+    def getCovering(self, location_id: int) -> List[Alarm]:
+        "覆盖某地区的预警，即地区编号为 location_id 的前缀（含相等）的预警"
+        keys: List[str] = []
+        node: _TrieNode = self._trie
+        for digit in str(location_id):
+            child: Optional[_TrieNode] = node.children.get(digit)
+            if child is None:
+                break
+            node = child
+            keys.extend(node.keys)
+        return [self.alarms[key] for key in keys]
+
+    def getWithin(self, location_id: int) -> List[Alarm]:
+        "位于某地区内的预警，即地区编号以 location_id 开头的预警"
+        node: _TrieNode = self._trie
+        for digit in str(location_id):
+            child: Optional[_TrieNode] = node.children.get(digit)
+            if child is None:
+                return []
+            node = child
+        keys: List[str] = []
+        stack: List[_TrieNode] = [node]
+        while stack:
+            node = stack.pop()
+            keys.extend(node.keys)
+            stack.extend(node.children.values())
+        return [self.alarms[key] for key in keys]
+
+    def _iterBox(self, lng: float, lat: float,
+                 radius: float) -> Iterator[Alarm]:
+        "产出与 (lng, lat) 距离可能不超过 radius 千米的网格中的预警"
+        angle: float = radius / EARTH_RADIUS
+        lat_span: float = degrees(angle)
+        if abs(lat) + lat_span >= 90 or angle >= 1.5:
+            lng_min, lng_max = -180.0, 180.0
+        else:
+            lng_span: float = degrees(
+                asin(min(1.0,
+                         sin(angle) / cos(radians(lat)))))
+            lng_min, lng_max = lng - lng_span, lng + lng_span
+        x_min, y_min = self._cell(lng_min, lat - lat_span)
+        x_max, y_max = self._cell(lng_max, lat + lat_span)
+        if (x_max - x_min + 1) * (y_max - y_min + 1) > len(self._cells):
+            # 范围内的网格多于非空网格时，直接遍历非空网格
+            cells: Iterable[Set[str]] = (
+                keys for (x, y), keys in self._cells.items()
+                if x_min <= x <= x_max and y_min <= y <= y_max)
+        else:
+            cells = (self._cells.get((x, y), set())
+                     for x in range(x_min, x_max + 1)
+                     for y in range(y_min, y_max + 1))
+        for keys in cells:
+            for key in keys:
+                yield self.alarms[key]
+
+    @staticmethod
+    def _ringCells(x0: int, y0: int, ring: int) -> Iterator[Tuple[int, int]]:
+        "与 (x0, y0) 的切比雪夫距离恰为 ring 的网格"
+        if ring == 0:
+            yield x0, y0
+            return
+        for x in range(x0 - ring, x0 + ring + 1):
+            yield x, y0 - ring
+            yield x, y0 + ring
+        for y in range(y0 - ring + 1, y0 + ring):
+            yield x0 - ring, y
+            yield x0 + ring, y
+
+    def getWithinRadius(self, lng: float, lat: float,
+                        radius: float) -> List[Alarm]:
+        "与 (lng, lat) 距离不超过 radius 千米的预警，按距离由近到远排列"
+        pairs: List[Tuple[float, Alarm]] = []
+        for alarm in self._iterBox(lng, lat, radius):
+            d: float = distance(lng, lat, alarm.lng_E, alarm.lat_N)
+            if d <= radius:
+                pairs.append((d, alarm))
+        pairs.sort(key=lambda pair: pair[0])
+        return [alarm for _, alarm in pairs]
+
+    def getNearest(self, lng: float, lat: float, k: int = 1) -> List[Alarm]:
+        "距离 (lng, lat) 最近的 k 个预警，按距离由近到远排列"
+        if k <= 0 or not self.alarms:
+            return []
+        # 由内向外逐圈扫描网格，直到找到至少 k 个候选
+        x0, y0 = self._cell(lng, lat)
+        candidates: List[Alarm] = []
+        ring: int = 0
+        while len(candidates) < min(k, len(self.alarms)):
+            if (2 * ring + 1)**2 > 4 * len(self._cells):
+                # 扫描范围已远大于非空网格数时，直接以全部预警为候选
+                candidates = list(self.alarms.values())
+                break
+            for cell in self._ringCells(x0, y0, ring):
+                for key in self._cells.get(cell, set()):
+                    candidates.append(self.alarms[key])
+            ring += 1
+        # 圈外的预警仍可能更近，以第 k 近的距离为半径再查询一次
+        radius: float = nsmallest(
+            k, (distance(lng, lat, alarm.lng_E, alarm.lat_N)
+                for alarm in candidates))[-1]
+        return self.getWithinRadius(lng, lat, radius)[:k]
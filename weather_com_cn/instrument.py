@@ -0,0 +1,153 @@
+"""爬虫的插桩接口
+
+WeatherCrawler、AlarmCrawler 及 LocationID 的各阶段以 span 报告耗时，
+以 count 报告计数，均交给构造时传入的 Instrument；未传入时二者立即返回，
+开销仅为一次函数调用。
+
+阶段（span）：'fetch' 下载、'decode' 解码、'parse' 解析、'build' 构造模型；
+计数（count）：'bytes_fetched' 下载的字节数、'rows_parsed' 解析出的行数、
+'rows_filtered' 被过滤掉的行数、'cache_hits'/'cache_misses' 缓存命中及未命中次数、
+'poll_errors' AlarmPoller.watch 中失败的轮询次数。
+附带的属性（attrs）中，crawler 为 'forecast'、'alarm' 或 'location'，
+url 为页面的网址（如有），cache 为缓存的名称，error 为异常的类名。
+"""
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, ContextManager, Dict, Optional
+from contextlib import nullcontext
+__all__ = ('Instrument', 'Callbacks', 'MetricsRegistry', 'span', 'count')
+
+
+class Instrument():
+    "插桩的接口，默认不做任何事，子类覆盖 onSpan、onCount 以导出"
+
+    def onSpan(self, name: str, seconds: float, attrs: Dict[str, Any]) -> None:
+        "阶段 name 结束，耗时 seconds 秒"
+
+    def onCount(self, name: str, value: float, attrs: Dict[str, Any]) -> None:
+        "计数 name 增加 value"
+
+
+class Callbacks(Instrument):
+    "将各事件交给回调函数，参数同 Instrument.onSpan、Instrument.onCount"
+
+    def __init__(self,
+                 on_span: Optional[Callable[[str, float, Dict[str, Any]],
+                                            None]] = None,
+                 on_count: Optional[Callable[[str, float, Dict[str, Any]],
+                                             None]] = None):
+        self.on_span = on_span
+        self.on_count = on_count
+
+    def onSpan(self, name: str, seconds: float, attrs: Dict[str, Any]) -> None:
+        if self.on_span is not None:
+            self.on_span(name, seconds, attrs)
+
+    def onCount(self, name: str, value: float, attrs: Dict[str, Any]) -> None:
+        if self.on_count is not None:
+            self.on_count(name, value, attrs)
+
+
+class _SpanStats():
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+
+class MetricsRegistry(Instrument):
+    """在内存中汇总各事件，线程安全
+
+    group_by 为属性名的元组，各事件按名称及这些属性的值分组，
+    如 ('crawler',) 可分别统计各爬虫，('url',) 可分别统计各页面
+    """
+    group_by: tuple
+
+    def __init__(self, group_by: tuple = ()):
+        self.group_by = group_by
+        self._spans: Dict[tuple, _SpanStats] = {}
+        self._counters: Dict[tuple, float] = {}
+        self._lock = Lock()
+
+    def _key(self, name: str, attrs: Dict[str, Any]) -> tuple:
+        return (name, *(attrs.get(attr) for attr in self.group_by))
+
+    def onSpan(self, name: str, seconds: float, attrs: Dict[str, Any]) -> None:
+        key: tuple = self._key(name, attrs)
+        with self._lock:
+            stats: Optional[_SpanStats] = self._spans.get(key)
+            if stats is None:
+                stats = self._spans[key] = _SpanStats()
+            stats.count += 1
+            stats.total += seconds
+            if seconds > stats.max:
+                stats.max = seconds
+
+    def onCount(self, name: str, value: float, attrs: Dict[str, Any]) -> None:
+        key: tuple = self._key(name, attrs)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @property
+    def spans(self) -> Dict[tuple, Dict[str, float]]:
+        "各阶段的次数、总耗时及最大耗时（秒），键为（名称，*group_by 各属性的值）"
+        with self._lock:
+            return {
+                key: {
+                    'count': stats.count,
+                    'total': stats.total,
+                    'max': stats.max
+                }
+                for key, stats in self._spans.items()
+            }
+
+    @property
+    def counters(self) -> Dict[tuple, float]:
+        "各计数的值，键同 spans"
+        with self._lock:
+            return dict(self._counters)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+
+class _Span():
+    __slots__ = ('instrument', 'name', 'attrs', 'start')
+
+    def __init__(self, instrument: Instrument, name: str,
+                 attrs: Dict[str, Any]):
+        self.instrument = instrument
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self) -> '_Span':
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        seconds: float = perf_counter() - self.start
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.instrument.onSpan(self.name, seconds, self.attrs)
+
+
+_null_span: ContextManager[None] = nullcontext()
+
+
+def span(instrument: Optional[Instrument], name: str,
+         **attrs: Any) -> ContextManager:
+    "以 with 语句计时，结束时调用 instrument.onSpan；instrument 为 None 时不计时"
+    if instrument is None:
+        return _null_span
+    return _Span(instrument, name, attrs)
+
+
+def count(instrument: Optional[Instrument], name: str, value: float,
+          **attrs: Any) -> None:
+    "调用 instrument.onCount，instrument 为 None 时不做任何事"
+    if instrument is not None:
+        instrument.onCount(name, value, attrs)
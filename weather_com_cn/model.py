@@ -1,10 +1,10 @@
 from pydantic import BaseModel
 from datetime import datetime, date
-from typing import Optional, Dict
+from typing import Optional, Dict, NamedTuple
 from enum import Enum
 from aenum import MultiValueEnum
 __all__ = ('WeatherInfo', 'Weather', 'Alarm', 'AlarmKind', 'AlarmDetail',
-           'AlarmLevel')
+           'AlarmLevel', 'WeatherInfoRecord', 'WeatherRecord', 'AlarmRecord')
 
 
 class WeatherInfo(BaseModel):
@@ -139,6 +139,63 @@ class AlarmDetail(BaseModel):
     "天气网站的原始信息"
 
 
+class WeatherInfoRecord(NamedTuple):
+    "天气信息的轻量记录，字段同 WeatherInfo，不经 pydantic 校验"
+    event: str
+    wind_dir: str
+    wind_scale: str
+
+    def toModel(self) -> WeatherInfo:
+        return WeatherInfo.construct(event=self.event,
+                                     wind_dir=self.wind_dir,
+                                     wind_scale=self.wind_scale)
+
+
+class WeatherRecord(NamedTuple):
+    "县/区天气的轻量记录，字段同 Weather，不经 pydantic 校验"
+    province: str
+    province_url: str
+    city: str
+    district: str
+    district_id: int
+    date: date
+    update_time: datetime
+    day_weather: Optional[WeatherInfoRecord]
+    night_weather: WeatherInfoRecord
+    temp_max: Optional[int]
+    temp_min: int
+
+    def toModel(self) -> Weather:
+        return Weather.construct(
+            province=self.province,
+            province_url=self.province_url,
+            city=self.city,
+            district=self.district,
+            district_id=self.district_id,
+            date=self.date,
+            update_time=self.update_time,
+            day_weather=None
+            if self.day_weather is None else self.day_weather.toModel(),
+            night_weather=self.night_weather.toModel(),
+            temp_max=self.temp_max,
+            temp_min=self.temp_min)
+
+
+class AlarmRecord(NamedTuple):
+    "气象预警的轻量记录，字段同 Alarm，不经 pydantic 校验"
+    location: str
+    lng_E: float
+    lat_N: float
+    location_id: int
+    kind: AlarmKind
+    level: AlarmLevel
+    time: datetime
+    short_url: str
+
+    def toModel(self) -> Alarm:
+        return Alarm.construct(**self._asdict())
+
+
 provincial_cities: set = {'香港', '澳门', '重庆', '北京', '天津', '上海'}
 provinces: set = {
     '北京', '安徽', '重庆', '福建', '甘肃', '广东', '广西', '贵州', '海南', '河北', '河南', '湖北',
@@ -0,0 +1,334 @@
+"""天气预报及气象预警的紧凑二进制快照
+
+快照文件由文件头、字符串表及若干定长的列组成：
+重复的字符串（省、市、天气现象、风向等）只在字符串表中保存一次，列中存其序号；
+AlarmKind、AlarmLevel 存为整数代码；日期及时间存为相对于文件头中基准值的差值。
+读取时以 mmap 映射文件，各列直接以 memoryview 访问，不复制数据，
+只在访问某一行时才构造对应的对象。
+"""
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Tuple, Union)
+import json
+import mmap
+import struct
+import sys
+from .model import (Alarm, AlarmDetail, AlarmKind, AlarmLevel, AlarmRecord,
+                    Weather, WeatherInfo, WeatherRecord)
+__all__ = ('Snapshot', 'writeWeathers', 'writeAlarms', 'writeAlarmDetails')
+
+MAGIC: bytes = b'WCNS'
+VERSION: int = 1
+KINDS: Tuple[str, ...] = ('weather', 'alarm', 'alarm_detail')
+"快照的类型，文件头中存其序号"
+
+_TIMEZONE: timezone = timezone(timedelta(hours=8), "Asia/Shanghai")
+_EPOCH: datetime = datetime(1970, 1, 1, tzinfo=_TIMEZONE)
+_NONE: int = 0xFFFFFFFF
+"字符串列中表示 None 的序号"
+_NO_TEMP: int = -32768
+"气温列中表示 None 的值"
+
+# 文件头：魔数、版本、类型、行数、基准日期（序数）、基准时间（北京时间的秒数）
+_header = struct.Struct('<4sHHIiq')
+
+_COLUMNS: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    'weather':
+    (('province', 'I'), ('province_url', 'I'), ('city', 'I'),
+     ('district', 'I'), ('district_id', 'I'), ('date', 'H'),
+     ('update_time', 'i'), ('day_event', 'I'), ('day_wind_dir', 'I'),
+     ('day_wind_scale', 'I'), ('night_event', 'I'), ('night_wind_dir', 'I'),
+     ('night_wind_scale', 'I'), ('temp_max', 'h'), ('temp_min', 'h')),
+    'alarm': (('location', 'I'), ('lng_E', 'd'), ('lat_N', 'd'),
+              ('location_id', 'I'), ('kind', 'B'), ('level', 'B'),
+              ('time', 'i'), ('short_url', 'I')),
+    'alarm_detail':
+    (('title', 'I'), ('alarm_id', 'I'), ('province_name', 'I'),
+     ('city_name', 'I'), ('time', 'i'), ('content', 'I'),
+     ('relieve_time', 'i'), ('kind', 'B'), ('level', 'B'), ('raw_info', 'I'))
+}
+"各类型快照的列名及其类型（array 的 typecode）"
+
+
+def _seconds(time: datetime) -> int:
+    "距 1970-01-01 00:00（北京时间）的秒数，不含时区的时间视为北京时间"
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=_TIMEZONE)
+    return int((time - _EPOCH).total_seconds())
+
+
+class _StringTable():
+    "写入时的字符串表，相同的字符串只保存一次"
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return _NONE
+        n: Optional[int] = self.index.get(value)
+        if n is None:
+            n = self.index[value] = len(self.strings)
+            self.strings.append(value)
+        return n
+
+    def toBytes(self) -> bytes:
+        "字符串数、各字符串的结束偏移量，及 UTF-8 编码的内容"
+        blobs: List[bytes] = [s.encode() for s in self.strings]
+        ends = array('I')
+        end: int = 0
+        for blob in blobs:
+            end += len(blob)
+            ends.append(end)
+        return struct.pack('<I', len(blobs)) + _littleEndian(ends).tobytes(
+        ) + b''.join(blobs)
+
+
+def _littleEndian(column: array) -> array:
+    if sys.byteorder != 'little':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+
+def _write(path: str, kind: str, count: int, base_date: int, base_time: int,
+           strings: _StringTable, columns: Dict[str, array]) -> None:
+    with open(path, 'wb') as f:
+        f.write(
+            _header.pack(MAGIC, VERSION, KINDS.index(kind), count, base_date,
+                         base_time))
+        f.write(strings.toBytes())
+        for name, typecode in _COLUMNS[kind]:
+            column: array = columns[name]
+            assert column.typecode == typecode and len(column) == count
+            f.write(b'\0' * (-f.tell() % 8))  # 各列按 8 字节对齐
+            f.write(_littleEndian(column).tobytes())
+
+
+def _newColumns(kind: str) -> Dict[str, array]:
+    return {name: array(typecode) for name, typecode in _COLUMNS[kind]}
+
+
+def writeWeathers(path: str, weathers: Iterable[Union[Weather,
+                                                      WeatherRecord]]) -> int:
+    "将 Weather 或 WeatherRecord 写入快照文件，返回写入的行数"
+    weathers = list(weathers)
+    strings = _StringTable()
+    columns: Dict[str, array] = _newColumns('weather')
+    base_date: int = min((w.date.toordinal() for w in weathers), default=0)
+    base_time: int = min((_seconds(w.update_time) for w in weathers),
+                         default=0) // 60 * 60
+    for w in weathers:
+        for name in ('province', 'province_url', 'city', 'district'):
+            columns[name].append(strings.add(getattr(w, name)))
+        columns['district_id'].append(w.district_id)
+        columns['date'].append(w.date.toordinal() - base_date)
+        # 更新时间精确到分钟
+        columns['update_time'].append(
+            (_seconds(w.update_time) - base_time) // 60)
+        day = w.day_weather
+        columns['day_event'].append(
+            strings.add(None if day is None else day.event))
+        columns['day_wind_dir'].append(
+            strings.add(None if day is None else day.wind_dir))
+        columns['day_wind_scale'].append(
+            strings.add(None if day is None else day.wind_scale))
+        columns['night_event'].append(strings.add(w.night_weather.event))
+        columns['night_wind_dir'].append(strings.add(w.night_weather.wind_dir))
+        columns['night_wind_scale'].append(
+            strings.add(w.night_weather.wind_scale))
+        columns['temp_max'].append(_NO_TEMP if w.temp_max is None else w.
+                                   temp_max)
+        columns['temp_min'].append(w.temp_min)
+    _write(path, 'weather', len(weathers), base_date, base_time, strings,
+           columns)
+    return len(weathers)
+
+
+def writeAlarms(path: str, alarms: Iterable[Union[Alarm, AlarmRecord]]) -> int:
+    "将 Alarm 或 AlarmRecord 写入快照文件，返回写入的行数"
+    alarms = list(alarms)
+    strings = _StringTable()
+    columns: Dict[str, array] = _newColumns('alarm')
+    base_time: int = min((_seconds(a.time) for a in alarms), default=0)
+    for a in alarms:
+        columns['location'].append(strings.add(a.location))
+        columns['lng_E'].append(a.lng_E)
+        columns['lat_N'].append(a.lat_N)
+        columns['location_id'].append(a.location_id)
+        columns['kind'].append(a.kind.value)
+        columns['level'].append(a.level.value)
+        columns['time'].append(_seconds(a.time) - base_time)
+        columns['short_url'].append(strings.add(a.short_url))
+    _write(path, 'alarm', len(alarms), 0, base_time, strings, columns)
+    return len(alarms)
+
+
+def writeAlarmDetails(path: str, details: Iterable[AlarmDetail]) -> int:
+    "将 AlarmDetail 写入快照文件，返回写入的行数"
+    details = list(details)
+    strings = _StringTable()
+    columns: Dict[str, array] = _newColumns('alarm_detail')
+    base_time: int = min((_seconds(d.time) for d in details), default=0)
+    for d in details:
+        for name in ('title', 'alarm_id', 'province_name', 'city_name',
+                     'content'):
+            columns[name].append(strings.add(getattr(d, name)))
+        columns['time'].append(_seconds(d.time) - base_time)
+        columns['relieve_time'].append(_seconds(d.relieve_time) - base_time)
+        columns['kind'].append(d.kind.value)
+        columns['level'].append(d.level.value)
+        columns['raw_info'].append(
+            strings.add(json.dumps(d.raw_info, ensure_ascii=False)))
+    _write(path, 'alarm_detail', len(details), 0, base_time, strings,
+           columns)
+    return len(details)
+
+
+class Snapshot():
+    """以 mmap 读取的快照文件
+
+    kind 为快照的类型（'weather'、'alarm' 或 'alarm_detail'）；
+    column 返回某列的 memoryview（字符串列为字符串表中的序号），不复制数据；
+    按下标访问或迭代时才构造对应的对象（以 construct 构造，不经 pydantic 校验）。
+    """
+    kind: str
+    base_date: date
+    base_time: datetime
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+        magic, version, kind, self._count, base_date, base_time = \
+            _header.unpack_from(self._buffer)
+        if magic != MAGIC:
+            raise ValueError(f'not a snapshot file: {path!r}')
+        if version != VERSION:
+            raise ValueError(f'unknown version: {version!r}')
+        self.kind = KINDS[kind]
+        self.base_date = date.fromordinal(base_date) if base_date else date.min
+        self.base_time = _EPOCH + timedelta(seconds=base_time)
+        offset: int = _header.size
+        (n, ) = struct.unpack_from('<I', self._buffer, offset)
+        offset += 4
+        self._ends: memoryview = self._cast(offset, 'I', n)
+        offset += 4 * n
+        self._blob_offset: int = offset
+        offset += self._ends[n - 1] if n else 0
+        self._strings: List[Optional[str]] = [None] * n
+        self._columns: Dict[str, memoryview] = {}
+        for name, typecode in _COLUMNS[self.kind]:
+            offset += -offset % 8
+            self._columns[name] = self._cast(offset, typecode, self._count)
+            offset += self._columns[name].nbytes
+
+    def _cast(self, offset: int, typecode: str, count: int) -> memoryview:
+        size: int = struct.calcsize(typecode)
+        view: memoryview = self._buffer[offset:offset + size * count]
+        if sys.byteorder != 'little':
+            column = array(typecode, view.tobytes())
+            column.byteswap()
+            return memoryview(column)
+        # typecode 来自 _COLUMNS，typeshed 只接受字面量
+        return view.cast(typecode)  # type: ignore[call-overload]
+
+    def close(self) -> None:
+        for view in (*self._columns.values(), self._ends, self._buffer):
+            view.release()
+        self._columns.clear()
+        self._mmap.close()
+
+    def __enter__(self) -> 'Snapshot':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def column(self, name: str) -> memoryview:
+        return self._columns[name]
+
+    def string(self, n: int) -> Optional[str]:
+        "字符串表中序号为 n 的字符串，n 为 _NONE 时返回 None"
+        if n == _NONE:
+            return None
+        value: Optional[str] = self._strings[n]
+        if value is None:
+            start: int = self._ends[n - 1] if n else 0
+            value = self._strings[n] = str(
+                self._buffer[self._blob_offset + start:self._blob_offset +
+                             self._ends[n]], 'utf-8')
+        return value
+
+    def __getitem__(self, n: int) -> Any:
+        if n < 0:
+            n += self._count
+        if not 0 <= n < self._count:
+            raise IndexError(n)
+        build: Callable[[int], Any] = getattr(
+            self, '_build' + ''.join(s.title() for s in self.kind.split('_')))
+        return build(n)
+
+    def __iter__(self) -> Iterator[Any]:
+        for n in range(self._count):
+            yield self[n]
+
+    def _time(self, seconds: int) -> datetime:
+        return self.base_time + timedelta(seconds=seconds)
+
+    def _buildWeather(self, n: int) -> Weather:
+        c: Dict[str, memoryview] = self._columns
+        s = self.string
+        day_event: Optional[str] = s(c['day_event'][n])
+        temp_max: int = c['temp_max'][n]
+        return Weather.construct(
+            province=s(c['province'][n]),
+            province_url=s(c['province_url'][n]),
+            city=s(c['city'][n]),
+            district=s(c['district'][n]),
+            district_id=c['district_id'][n],
+            date=self.base_date + timedelta(days=c['date'][n]),
+            update_time=self._time(c['update_time'][n] * 60),
+            day_weather=None if day_event is None else WeatherInfo.construct(
+                event=day_event,
+                wind_dir=s(c['day_wind_dir'][n]),
+                wind_scale=s(c['day_wind_scale'][n])),
+            night_weather=WeatherInfo.construct(
+                event=s(c['night_event'][n]),
+                wind_dir=s(c['night_wind_dir'][n]),
+                wind_scale=s(c['night_wind_scale'][n])),
+            temp_max=None if temp_max == _NO_TEMP else temp_max,
+            temp_min=c['temp_min'][n])
+
+    def _buildAlarm(self, n: int) -> Alarm:
+        c: Dict[str, memoryview] = self._columns
+        return Alarm.construct(location=self.string(c['location'][n]),
+                               lng_E=c['lng_E'][n],
+                               lat_N=c['lat_N'][n],
+                               location_id=c['location_id'][n],
+                               kind=AlarmKind(c['kind'][n]),
+                               level=AlarmLevel(c['level'][n]),
+                               time=self._time(c['time'][n]),
+                               short_url=self.string(c['short_url'][n]))
+
+    def _buildAlarmDetail(self, n: int) -> AlarmDetail:
+        c: Dict[str, memoryview] = self._columns
+        s = self.string
+        raw_info: Optional[str] = s(c['raw_info'][n])
+        assert raw_info is not None
+        return AlarmDetail.construct(
+            title=s(c['title'][n]),
+            alarm_id=s(c['alarm_id'][n]),
+            province_name=s(c['province_name'][n]),
+            city_name=s(c['city_name'][n]),
+            time=self._time(c['time'][n]),
+            content=s(c['content'][n]),
+            relieve_time=self._time(c['relieve_time'][n]),
+            kind=AlarmKind(c['kind'][n]),
+            level=AlarmLevel(c['level'][n]),
+            raw_info=json.loads(raw_info))
@@ -0,0 +1,242 @@
+"各爬虫共用的 HTTP 传输层"
+from copy import copy
+from threading import Event, Lock
+from time import monotonic, sleep
+from typing import Any, Dict, List, Optional, Pattern, Tuple, Union
+from urllib.parse import urlsplit
+import re
+from requests import PreparedRequest, Response, Session
+from requests.adapters import HTTPAdapter
+from requests.compat import chardet
+from urllib3.util.retry import Retry
+__all__ = ('Transport', 'getDefaultTransport', 'EncodingStrategy',
+           'decodeResponse', 'decodeContent')
+
+
+class _TokenBucket():
+    "令牌桶限速器，每秒补充 rate 个令牌，至多积累 burst 个"
+    __slots__ = ('rate', 'burst', '_tokens', '_time', '_lock')
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens: float = burst
+        self._time: float = monotonic()
+        self._lock = Lock()
+
+    def acquire(self) -> None:
+        "取出一个令牌，没有令牌时等待"
+        with self._lock:
+            now: float = monotonic()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._time) * self.rate)
+            self._time = now
+            self._tokens -= 1
+            wait: float = -self._tokens / self.rate
+        if wait > 0:
+            sleep(wait)
+
+
+class _InFlight():
+    "进行中的请求，供相同的并发请求等待其结果"
+    __slots__ = ('done', 'response', 'error')
+
+    def __init__(self):
+        self.done = Event()
+        self.response: Optional[Response] = None
+        self.error: Optional[BaseException] = None
+
+
+class Transport(Session):
+    """带连接池、超时、重试及限速的 Session
+
+    pool_size 为每个主机的连接池大小；timeout 为未指定 timeout 的请求的默认超时（秒）；
+    retries 为连接错误及 5xx 响应的最大重试次数，重试间隔按 backoff_factor 指数增长；
+    rate 为每个主机每秒的请求数上限（令牌桶，可积累 burst 个，默认为 rate），
+    为 None 时不限速；coalesce 为 True 时，并发的相同 GET 请求只发出一次，
+    共享其响应。
+    """
+    timeout: Optional[Union[float, Tuple[float, float]]]
+    rate: Optional[float]
+    burst: float
+    coalesce: bool
+    RETRY_STATUSES: Tuple[int, ...] = (500, 502, 503, 504)
+
+    def __init__(self,
+                 pool_size: int = 32,
+                 timeout: Optional[Union[float, Tuple[float, float]]] = 30,
+                 retries: int = 3,
+                 backoff_factor: float = 0.5,
+                 rate: Optional[float] = None,
+                 burst: Optional[float] = None,
+                 coalesce: bool = True):
+        super().__init__()
+        self.timeout = timeout
+        self.rate = rate
+        self.burst = max(rate or 1, 1) if burst is None else burst
+        self.coalesce = coalesce
+        self._buckets: Dict[str, _TokenBucket] = {}
+        self._in_flight: Dict[tuple, _InFlight] = {}
+        self._lock = Lock()
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size,
+                              max_retries=Retry(
+                                  total=retries,
+                                  backoff_factor=backoff_factor,
+                                  status_forcelist=self.RETRY_STATUSES,
+                                  allowed_methods=('GET', 'HEAD'),
+                                  raise_on_status=False))
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def request(self, method: str, url: str, *args: Any,
+                **kwargs: Any) -> Response:
+        if 'timeout' not in kwargs:  # 显式传入 timeout=None 时不超时
+            kwargs['timeout'] = self.timeout
+        if (not self.coalesce or method.upper() != 'GET' or args
+                or kwargs.get('stream') or any(
+                    kwargs.get(k) is not None
+                    for k in ('data', 'json', 'files'))):
+            return super().request(method, url, *args, **kwargs)
+        # 只合并各参数均相同的请求（timeout、auth、cookies、proxies、verify 等）
+        key = (url, repr(kwargs.get('params')),
+               repr(sorted((kwargs.get('headers') or {}).items())),
+               repr(sorted((k, v) for k, v in kwargs.items()
+                           if k not in ('params', 'headers'))))
+        with self._lock:
+            in_flight: Optional[_InFlight] = self._in_flight.get(key)
+            leader: bool = in_flight is None
+            if in_flight is None:
+                in_flight = self._in_flight[key] = _InFlight()
+        if not leader:
+            in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            assert in_flight.response is not None
+            # 各调用者可能修改 encoding 等属性，故返回浅拷贝
+            return copy(in_flight.response)
+        try:
+            in_flight.response = super().request(method, url, **kwargs)
+            return in_flight.response
+        except BaseException as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            in_flight.done.set()
+
+    def send(self, request: PreparedRequest, **kwargs: Any) -> Response:
+        if self.rate is not None:
+            host: str = urlsplit(request.url).netloc
+            bucket: Optional[_TokenBucket] = self._buckets.get(host)
+            if bucket is None:
+                with self._lock:
+                    bucket = self._buckets.setdefault(
+                        host, _TokenBucket(self.rate, self.burst))
+            bucket.acquire()
+        return super().send(request, **kwargs)
+
+
+_default_transport: Optional[Transport] = None
+_default_lock = Lock()
+
+
+def getDefaultTransport() -> Transport:
+    "各爬虫未传入 session 时共用的 Transport"
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = Transport()
+        return _default_transport
+
+
+_charset_re = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+_digits_re = re.compile(r'\d+')
+
+
+class EncodingStrategy():
+    """确定响应内容的编码，尽量避免逐字节统计的编码检测
+
+    依次尝试：Content-Type 中显式声明的 charset；按 URL 模式（去掉查询参数、
+    数字替换为 #）缓存的编码，其初值来自 known（{URL 正则表达式: 编码}）；
+    以上均以严格模式解码，失败时继续尝试下一项。最后才进行编码检测，
+    并将结果缓存于该 URL 模式下。
+    """
+    KNOWN_ENCODINGS: Dict[str, str] = {
+        r'^https?://(www|product)\.weather\.com\.cn/': 'utf-8'
+    }
+    "weather.com.cn 的页面及数据均为 UTF-8"
+    detections: int
+    "进行编码检测的次数"
+
+    def __init__(self, known: Optional[Dict[str, str]] = None):
+        self._known: List[Tuple[Pattern, str]] = [
+            (re.compile(pattern), encoding) for pattern, encoding in (
+                self.KNOWN_ENCODINGS if known is None else known).items()
+        ]
+        self._cache: Dict[str, str] = {}
+        self.detections = 0
+
+    @staticmethod
+    def urlPattern(url: str) -> str:
+        "URL 的模式：去掉查询参数及片段，数字替换为 #"
+        parts = urlsplit(url)
+        return _digits_re.sub('#', f'{parts.scheme}://{parts.netloc}{parts.path}')
+
+    def _candidates(self, url: str, pattern: str,
+                    content_type: Optional[str]) -> List[str]:
+        candidates: List[str] = []
+        match = _charset_re.search(content_type or '')
+        if match:
+            candidates.append(match.group(1))
+        cached: Optional[str] = self._cache.get(pattern)
+        if cached is not None:
+            candidates.append(cached)
+        else:
+            for regex, encoding in self._known:
+                if regex.search(url):
+                    candidates.append(encoding)
+                    break
+        return candidates
+
+    def decode(self,
+               url: str,
+               content: bytes,
+               content_type: Optional[str] = None) -> Tuple[str, str]:
+        "解码 url 的响应内容，返回（内容，所用编码）"
+        pattern: str = self.urlPattern(url)
+        for encoding in self._candidates(url, pattern, content_type):
+            try:
+                text: str = content.decode(encoding)
+            except (UnicodeDecodeError, LookupError):
+                continue
+            self._cache[pattern] = encoding
+            return text, encoding
+        self.detections += 1
+        encoding = chardet.detect(content)['encoding'] or 'utf-8'
+        self._cache[pattern] = encoding
+        return content.decode(encoding, errors='replace'), encoding
+
+
+_default_strategy = EncodingStrategy()
+
+
+def decodeResponse(resp: Response,
+                   strategy: Optional[EncodingStrategy] = None) -> str:
+    """以 strategy（默认为共用的 EncodingStrategy）解码响应内容
+
+    同时设置 resp.encoding，之后访问 resp.text 不再检测编码
+    """
+    text, resp.encoding = (strategy or _default_strategy).decode(
+        resp.url, resp.content, resp.headers.get('Content-Type'))
+    return text
+
+
+def decodeContent(url: str,
+                  content: bytes,
+                  content_type: Optional[str] = None,
+                  strategy: Optional[EncodingStrategy] = None) -> str:
+    "同 decodeResponse，用于已自行读取的响应内容"
+    return (strategy or _default_strategy).decode(url, content,
+                                                  content_type)[0]